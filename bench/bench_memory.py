@@ -0,0 +1,36 @@
+"""
+Memory of a typed expense frame per million rows, deep (strings included),
+by column: the row-wise version with a derived column per row
+(bench_transform.legacy_columns: object names, month labels, FOM dates,
+Necesse strings, ...) vs ledger_store.typed_columns (categorical names and
+types, amounts in cents, nothing derived), on a synthetic expense ledger.
+
+python bench/bench_memory.py [rows]
+"""
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+import pandas as pd
+
+from bench_transform import synthetic_ledger, legacy_columns
+from ledger_store import typed_columns
+
+
+def mb_per_million(df: pd.DataFrame) -> pd.Series:
+    """deep memory of every column (and the index) in MB per million rows"""
+    return df.memory_usage(deep=True) / 2 ** 20 * 1_000_000 / len(df)
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    df = synthetic_ledger(rows)
+    # as read from the .csv, names are strings
+    df["Name"] = df["Name"].astype(object)
+    before = mb_per_million(legacy_columns(df.copy()).sort_values("Date", kind="stable"))
+    after = mb_per_million(typed_columns(df.copy()).sort_values("Date", kind="stable"))
+
+    table = pd.DataFrame({"row-wise": before, "compact": after}).reindex(before.index)
+    table.loc["total"] = table.sum()
+    print(f"{rows:,} rows, MB per million rows ({table.loc['total', 'row-wise'] / table.loc['total', 'compact']:.1f}x less)")
+    print(table.round(1).fillna("-").to_string())
@@ -0,0 +1,57 @@
+"""
+Bytes per callback response of the spending-name figure, as px builds it
+(before) vs compacted by figure_payload (after), raw and gzipped (and
+brotli'd if it's installed). The range figures are drawn in the browser
+(range_figures), their callback sends nothing, the one-time series store
+they're drawn from is shown instead. Uses the ledgers in data/.
+
+python bench/bench_payload.py
+"""
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+import gzip
+
+from dash import Dash
+from plotly.io.json import to_json_plotly
+
+app = Dash(__name__, use_pages=True, pages_folder=str(Path(__file__).parents[1] / "src" / "pages"))
+from pages.budget_dash import get_money_dash
+from figure_payload import compact_figures
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def response_sizes(outputs: dict) -> tuple:
+    """(raw, gzip, brotli) bytes of a callback response with these {id: figure} outputs"""
+    body = to_json_plotly({"multi": True, "response": {key: {"figure": fig} for key, fig in outputs.items()}}).encode()
+    return len(body), len(gzip.compress(body, 6)), len(brotli.compress(body, quality=5)) if brotli else None
+
+
+def report(name: str, sizes: tuple):
+    raw, gzipped, brotlied = sizes
+    print(f"{name:<34}{raw:>10,}{gzipped:>10,}{brotlied if brotlied is not None else '-':>10}")
+
+
+if __name__ == "__main__":
+    money_dash = get_money_dash()
+    start, end = money_dash.expense_cube.days[0].date(), money_dash.expense_cube.days[-1].date()
+
+    # the undecorated method builds the figure as px returns it
+    build_name = money_dash.create_name_spend_fig.__wrapped__
+
+    print(f"{'bytes per callback':<34}{'raw':>10}{'gzip':>10}{'brotli':>10}")
+    series = to_json_plotly(money_dash.spending_series()).encode()
+    report("spending-range after (clientside)", (0, 0, 0 if brotli else None))
+    report("  + series store, once per page", (len(series), len(gzip.compress(series, 6)),
+                                                len(brotli.compress(series, quality=5)) if brotli else None))
+
+    for name, (range_start, range_end) in {"all": (start, end),
+                                           "month": (end.replace(day=1), end)}.items():
+        fig = build_name(money_dash, range_start, range_end)
+        report(f"spending-name {name} before", response_sizes({"spending-name": fig}))
+        report(f"spending-name {name} after", response_sizes({"spending-name": compact_figures(fig)}))
@@ -0,0 +1,135 @@
+"""
+Surplus/Left markers of the monthly range figure: one pair of traces per
+month (old, built on the server) vs the two batched traces that
+range_figures.render_range draws in the browser. Reports the markers' trace
+count and JSON size, and the time to build them (old: plotly + to_json on the
+server, batched: a whole render_range call in node, both figures). Needs node.
+
+python bench/bench_range_figs.py [years]
+"""
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+import datetime
+import json
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from range_figures import render_range
+
+types = ("Savings", "Rent", "Utilities", "Grocery", "Food", "Shop", "RecEnt", "TransportationT", "HealthWell", "Other")
+
+# renders the monthly figures of the whole range runs times, prints the markers and the time per render
+harness = """
+const fs = require("fs");
+const window = {dash_clientside: {no_update: null}};
+const render = %s;
+const [seriesPath, startYear, endYear, runs] = process.argv.slice(2);
+const series = JSON.parse(fs.readFileSync(seriesPath));
+let figures;
+const start = process.hrtime.bigint();
+for (let i = 0; i < +runs; i++) {
+    figures = render(startYear, endYear, "January", "December", "Monthly", null, series);
+}
+const ms = Number(process.hrtime.bigint() - start) / 1e6 / +runs;
+const markers = figures[0].data.filter(trace => trace.name === "Surplus" || trace.name === "Left");
+console.log(JSON.stringify({traces: markers.length, size: JSON.stringify(markers).length, ms}));
+"""
+
+
+def synthetic_series(years: int, seed: int = 0) -> dict:
+    """what MoneyDash.spending_series ships, for years of daily spend and twice-monthly income / budget"""
+    rng = np.random.default_rng(seed)
+    today = pd.Timestamp.today().normalize()
+    days = pd.date_range(today - pd.DateOffset(years=years) + pd.Timedelta(days=1), today, freq='D')
+    paydays = days[days.day.isin((1, 15))]
+    day_number = lambda dates: ((dates - pd.Timestamp(0)).days).tolist()
+    return {"first_day": day_number(days[:1])[0],
+            "expense": {name: rng.integers(0, 4000, len(days)).tolist() for name in types},
+            "days": day_number(paydays),
+            "income": rng.integers(150000, 250000, len(paydays)).tolist(),
+            "budget": rng.integers(120000, 180000, len(paydays)).tolist(),
+            "today": day_number(days[-1:])[0],
+            "types": list(types), "colors": {}, "hidden": [],
+            "frequencies": {"Monthly": ["M", "Month-Year"]},
+            "template": {}}
+
+
+def monthly_totals(series: dict) -> pd.DataFrame:
+    """spend, income and budget per month in cents, like the server built them before"""
+    days = pd.Timestamp(0) + pd.to_timedelta(series["first_day"] + np.arange(len(series["expense"][types[0]])), unit="D")
+    spend = pd.Series(np.sum([series["expense"][name] for name in types], axis=0), index=days.to_period('M'))
+    paydays = (pd.Timestamp(0) + pd.to_timedelta(series["days"], unit="D")).to_period('M')
+    df = pd.DataFrame({"Expense_Total": spend.groupby(level=0).sum(),
+                       "Income_Total": pd.Series(series["income"], index=paydays).groupby(level=0).sum(),
+                       "Budget_Total": pd.Series(series["budget"], index=paydays).groupby(level=0).sum()}).fillna(0)
+    return df.assign(**{"Month-Year": df.index.strftime("%b-%Y")})
+
+
+def legacy_traces(fig: go.Figure, df_all_group_sum: pd.DataFrame, today: datetime.datetime):
+    # the server-side range figure before the markers were batched
+    for idx, (year_month, row) in enumerate(df_all_group_sum.iterrows()):
+        month_year = row["Month-Year"]
+        month_spend_total, month_income_total, month_budget_total = row[["Expense_Total", "Income_Total", "Budget_Total"]] / 100
+        days_remaining = pd.Period(today, freq='M').end_time.date().day - today.day if today.month == year_month.month else 0
+        fig.add_trace(go.Scatter(x=[month_year, month_year],
+                                 y=[month_spend_total, month_income_total],
+                                 mode='lines',
+                                 line=dict(color='black', width=2),
+                                 name="Surplus",
+                                 hoverinfo="skip",
+                                 hovertext=f"{round(month_income_total - month_spend_total, 2)}",
+                                 hovertemplate=f"${round(month_income_total - month_spend_total, 2)}<extra></extra>",
+                                 legendgroup="Surplus",
+                                 showlegend=False if idx > 0 else True))
+        fig.add_trace(go.Scatter(x=[month_year, month_year],
+                                 y=[month_spend_total, month_budget_total],
+                                 mode='lines',
+                                 line=dict(color='darkgray', width=2),
+                                 name="Left",
+                                 hoverinfo="skip",
+                                 hovertext=f"{round(month_budget_total - month_spend_total, 2)} ({days_remaining})",
+                                 hovertemplate=f"${round(month_budget_total - month_spend_total, 2)} ({days_remaining})<extra></extra>",
+                                 legendgroup="Left",
+                                 showlegend=False if idx > 0 else True))
+
+
+def measure_legacy(series: dict) -> tuple:
+    df_all_group_sum = monthly_totals(series)
+    start = time.perf_counter()
+    fig = go.Figure()
+    legacy_traces(fig, df_all_group_sum, datetime.datetime.today())
+    payload = fig.to_json()
+    return len(fig.data), len(payload), (time.perf_counter() - start) * 1000
+
+
+def measure_batched(series: dict, runs: int = 20) -> tuple:
+    days = pd.Timestamp(0) + pd.to_timedelta([series["first_day"], series["today"]], unit="D")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        series_path, script_path = Path(temp_dir) / "series.json", Path(temp_dir) / "render.js"
+        series_path.write_text(json.dumps(series))
+        script_path.write_text(harness % render_range)
+        result = json.loads(subprocess.run(["node", str(script_path), str(series_path), str(days[0].year),
+                                            str(days[1].year), str(runs)],
+                                           capture_output=True, text=True, check=True).stdout)
+    return result["traces"], result["size"], result["ms"]
+
+
+if __name__ == "__main__":
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    series = synthetic_series(years)
+
+    print(f"{years} years ({len(monthly_totals(series))} months)")
+    rows = [("per month", measure_legacy)] + ([("batched", measure_batched)] if shutil.which("node") else [])
+    for label, measure in rows:
+        traces, size, ms = measure(series)
+        print(f"{label:>9}: {traces:4d} traces, {size / 1024:7.1f} KiB JSON, {ms:7.1f} ms")
+    if not shutil.which("node"):
+        print("  batched: needs node to run range_figures.render_range")
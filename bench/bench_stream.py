@@ -0,0 +1,46 @@
+"""
+Peak memory of loading a synthetic expense ledger whole vs streamed
+(ExpenseLedger.stream), at a few file sizes. The whole load grows with the
+rows, the streamed one with a chunk, the window, the days x types grid and
+months x (month_cap + types) name sums, i.e. with the span of the history
+(this one's is 10 years) but not with its rows.
+
+python bench/bench_stream.py [rows ...]
+"""
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+import tempfile
+import time
+import tracemalloc
+
+from bench_transform import synthetic_ledger
+from ledger_store import ExpenseLedger, ledger_dtypes
+
+
+def peak_load(file_path: Path, stream: bool) -> tuple:
+    """(peak traced MB, seconds, rows kept as the frame) of loading a ledger"""
+    ledger = ExpenseLedger(file_path, ledger_dtypes)
+    if stream:
+        ledger.stream_bytes = 0
+    tracemalloc.start()
+    start = time.perf_counter()
+    ledger.frame()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 2 ** 20, seconds, len(ledger.df)
+
+
+if __name__ == "__main__":
+    sizes = [int(rows) for rows in sys.argv[1:]] or [250_000, 1_000_000, 2_000_000]
+    print(f"{'rows':>10}{'file MB':>10}{'whole MB':>10}{'s':>7}{'stream MB':>11}{'s':>7}{'kept rows':>11}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for rows in sizes:
+            file_path = Path(temp_dir) / f"expenses_{rows}.csv"
+            synthetic_ledger(rows).to_csv(file_path, index=False)
+            whole_mb, whole_s, _ = peak_load(file_path, stream=False)
+            stream_mb, stream_s, kept = peak_load(file_path, stream=True)
+            print(f"{rows:>10,}{file_path.stat().st_size / 2 ** 20:>10.0f}{whole_mb:>10.0f}{whole_s:>7.1f}"
+                  f"{stream_mb:>11.0f}{stream_s:>7.1f}{kept:>11,}")
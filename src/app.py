@@ -1,5 +1,17 @@
 from dash import Dash, html, dcc
+from flask import jsonify, request
 import dash
+import gzip
+import os
+
+# optional, brotli compresses better than gzip if it's installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from figure_cache import figure_cache
+import ledger_worker
 
 app = Dash(__name__, use_pages=True)
 
@@ -23,5 +35,44 @@ app.layout = html.Div([
     html.Footer(id='bottom')
 ])
 
+
+# responses smaller than this aren't worth compressing
+min_compress_size = 1024
+
+
+# callback responses are mostly figure JSON, which compresses well
+@app.server.after_request
+def compress_response(response):
+    accepted = request.headers.get("Accept-Encoding", "")
+    if response.direct_passthrough or response.is_streamed or response.status_code != 200 \
+            or "Content-Encoding" in response.headers \
+            or not response.mimetype.startswith(("application/json", "application/javascript", "text/")):
+        return response
+    data = response.get_data()
+    if len(data) < min_compress_size:
+        return response
+
+    if brotli is not None and "br" in accepted:
+        response.set_data(brotli.compress(data, quality=5))
+        response.headers["Content-Encoding"] = "br"
+    elif "gzip" in accepted:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        return response
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+# hit/miss counters of the server-side figure cache, for sizing it
+@app.server.route("/stats/figure-cache")
+def figure_cache_stats():
+    return jsonify(figure_cache.stats())
+
+
 if __name__ == '__main__':
+    # ledgers and aggregates are refreshed in the background, only in the process
+    # that serves (not in the debug reloader's watcher)
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        ledger_worker.start()
     app.run_server(debug=True)
@@ -0,0 +1,49 @@
+"""
+Row-level change tracking for the cells_* DataTable editors. Rows carry
+their id (the row in the file, negative for rows added in the editor), edits
+are diffed in the browser against data_previous and kept in a dcc.Store, so a
+save only sends the changed rows and the store only writes those. The table
+only holds one page (ledger_pages), the pending changes are laid over it.
+The rows changed or deleted are also kept as they were first shown, the
+store checks the file still has them before writing (ids are rows in the
+file, another tab's save may have moved them).
+"""
+
+# nothing pending
+no_changes = {"rows": {}, "deleted": [], "original": {}}
+
+# data_timestamp -> pending changes, {rows: {id: row}, deleted: [ids], original: {id: row as shown}}
+track_changes = """
+function(timestamp, data, previous, pending) {
+    if (!previous) {
+        return window.dash_clientside.no_update;
+    }
+    pending = {rows: Object.assign({}, pending.rows), deleted: pending.deleted.slice(),
+               original: Object.assign({}, pending.original)};
+
+    const before = new Map(previous.map(row => [row.id, row]));
+    const after = new Set();
+    for (const row of data) {
+        after.add(row.id);
+        const old = before.get(row.id);
+        if (old !== row && (old === undefined || JSON.stringify(old) !== JSON.stringify(row))) {
+            pending.rows[row.id] = row;
+            if (row.id >= 0 && !(row.id in pending.original)) {
+                pending.original[row.id] = old;
+            }
+        }
+    }
+    for (const id of before.keys()) {
+        if (!after.has(id)) {
+            delete pending.rows[id];
+            if (id >= 0) {
+                pending.deleted.push(id);
+                if (!(id in pending.original)) {
+                    pending.original[id] = before.get(id);
+                }
+            }
+        }
+    }
+    return pending;
+}
+"""
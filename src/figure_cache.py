@@ -0,0 +1,89 @@
+from collections import OrderedDict
+
+import datetime
+import functools
+import inspect
+import threading
+import time
+
+from figure_payload import compact_figures
+
+
+class FigureCache:
+    """
+    LRU cache of built figures, entries also expire after ttl seconds.
+    Keys carry the data version the figure was built from, so after a ledger
+    changes only the figures that depend on it stop being hit.
+    """
+    def __init__(self, max_size: int = 128, ttl: float = 15 * 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits, self.misses = 0, 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # built outside the lock, two requests for the same new figure may both build it
+        value = build()
+        with self._lock:
+            self._entries[key] = (now, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._entries),
+                    "max_size": self.max_size,
+                    "ttl": self.ttl,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 3) if lookups else None}
+
+
+figure_cache = FigureCache()
+
+
+def _normalize(value):
+    # datetimes, dates and Timestamps of the same day are the same range bound
+    if isinstance(value, datetime.date):
+        return datetime.date(value.year, value.month, value.day).isoformat()
+    return value
+
+
+def cached_figure(*file_paths):
+    """
+    Cache a figure method on (method, normalized arguments, data version).
+    The instance has to have data_version(*file_paths), the version of the
+    ledgers (given here) that the figure is built from. Figures are cached
+    (and sent) compacted, see figure_payload.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            # bound with defaults, so f(a, b) and f(a, b, freq='Monthly') share an entry
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            key = (func.__qualname__,
+                   tuple(_normalize(value) for value in list(bound.arguments.values())[1:]),
+                   self.data_version(*file_paths))
+            return figure_cache.get_or_build(key, lambda: compact_figures(func(self, *args, **kwargs)))
+        return wrapper
+    return decorator
@@ -0,0 +1,54 @@
+"""
+Smaller figure JSON. Every figure px builds carries the whole default
+template (~7.5KB, mostly defaults of trace types and subplots the dashboard
+never draws). compact_figure gives a figure a template of just what's drawn
+here, with the per-trace properties all traces of a kind repeat
+(hovertemplates) moved into it. Amounts need no rounding, they're summed in
+cents and only divided into dollars for the figure (795.16, never
+795.1600000000001).
+
+Plotly's typed arrays (base64 "bdata") would be smaller still, but the
+plotly.js bundled with dash 2.13 (2.25) can't read them, they came with 2.28.
+"""
+import plotly.graph_objects as go
+import plotly.io as pio
+
+# trace types the dashboard draws, and layout parts of the default template it never uses
+drawn_traces = ("bar", "scatter", "pie")
+unused_layout = ("polar", "ternary", "scene", "geo", "mapbox", "colorscale", "coloraxis")
+
+
+def _compact_template() -> go.layout.Template:
+    template = pio.templates[pio.templates.default].to_plotly_json()
+    return go.layout.Template(data={kind: template["data"][kind] for kind in drawn_traces if kind in template["data"]},
+                              layout={key: value for key, value in template["layout"].items()
+                                      if key not in unused_layout})
+
+
+compact_template = _compact_template()
+
+
+def compact_figure(fig: go.Figure) -> go.Figure:
+    """fig (changed in place) with the compact template and the shared trace properties in it"""
+    template = go.layout.Template(compact_template)
+
+    # a hovertemplate all traces of a kind have goes to the template once
+    for kind in drawn_traces:
+        traces = [trace for trace in fig.data if trace.type == kind]
+        hovertemplates = {trace.hovertemplate for trace in traces}
+        if len(traces) > 1 and len(hovertemplates) == 1 and None not in hovertemplates:
+            defaults = list(template.data[kind]) or [{}]
+            defaults[0] = go.layout.Template(data={kind: defaults[:1]}).data[kind][0]
+            defaults[0].hovertemplate = hovertemplates.pop()
+            template.data[kind] = defaults
+            for trace in traces:
+                trace.hovertemplate = None
+    fig.layout.template = template
+    return fig
+
+
+def compact_figures(result):
+    """compact_figure of a figure, or of every figure of a tuple of them"""
+    if isinstance(result, tuple):
+        return tuple(compact_figures(fig) for fig in result)
+    return compact_figure(result) if isinstance(result, go.Figure) else result
@@ -0,0 +1,208 @@
+"""
+Import a bank / card statement export (.ofx, .qfx or .csv) into the expense
+data. Transactions are mapped onto Name, Amount, Type, Date: debits become
+expenses, and their Type comes from a RuleIndex that learned from the
+Name -> Type pairs already in the ledger.
+
+python import_statement.py statement.ofx [--dry-run] [--credits]
+"""
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import argparse
+import re
+import sys
+
+import pandas as pd
+
+import insert_expense
+from ledger_store import store, expense_fp
+from money import format_dollars, to_cents
+
+# fallback rules for names nothing was learned about, the first that matches wins
+keyword_rules = (("Savings", r"\bSAVINGS\b|\bTRANSFER TO\b"),
+                 ("Rent", r"\bRENT\b|\bLEASE\b|\bAPARTMENTS?\b"),
+                 ("Food", r"UBER ?EATS|DOORDASH|GRUBHUB|RESTAURANT|\bCAFE\b|COFFEE|PIZZA|STARBUCKS|MCDONALD|CHIPOTLE|\bBAR\b"),
+                 ("Grocery", r"GROCER|SUPERMARKET|\bMARKET\b|WHOLE ?FOODS|TRADER JOE|SAFEWAY|KROGER|ALDI|COSTCO"),
+                 ("Utilities", r"ELECTRIC|\bWATER\b|\bPOWER\b|INTERNET|COMCAST|XFINITY|VERIZON|AT&T|T-MOBILE|UTILIT"),
+                 ("TransportationT", r"\bUBER\b|\bLYFT\b|SHELL|CHEVRON|EXXON|\bBP\b|AIRLINE|AIRWAYS|TRANSIT|PARKING|\bGAS\b|\bFUEL\b"),
+                 ("HealthWell", r"PHARMACY|\bCVS\b|WALGREENS|\bGYM\b|FITNESS|DENTAL|MEDICAL|CLINIC|HOSPITAL"),
+                 ("RecEnt", r"NETFLIX|SPOTIFY|HULU|CINEMA|THEATRE|THEATER|TICKET|\bSTEAM\b|CONCERT"),
+                 ("Shop", r"AMAZON|\bAMZN\b|TARGET|WALMART|BEST ?BUY|\bEBAY\b|\bSTORE\b"))
+
+# statement .csv column names, lower case
+date_columns = ("date", "transaction date", "trans. date", "posted date", "posting date")
+name_columns = ("description", "name", "payee", "merchant", "memo", "details")
+amount_columns = ("amount", "transaction amount")
+
+# a learned prefix only counts when it's at least this long
+min_prefix = 5
+
+
+def normalize(names: pd.Series) -> pd.Series:
+    """upper case words without store numbers / references, 'Amazon Mktpl*2K3 SEATTLE' -> 'AMAZON MKTPL SEATTLE'"""
+    return names.astype(object).fillna("").astype(str).str.upper() \
+        .str.replace(r"[^A-Z0-9&' ]+", " ", regex=True) \
+        .str.replace(r"\b\w*\d\w*\b", " ", regex=True) \
+        .str.split().str.join(" ")
+
+
+class RuleIndex:
+    """
+    Name -> Type, in three steps: the exact (normalized) name seen in the
+    ledger (a dict), else the longest learned name prefix shared with it (a
+    trie, every node knows the most used Type below it), else the keyword
+    rules (compiled once, tried in order). Each distinct name is looked up once.
+    """
+    def __init__(self):
+        self.exact = {}
+        self.trie = {}
+        self.rules = [(type_name, re.compile(rule)) for type_name, rule in keyword_rules]
+
+    @classmethod
+    def from_ledger(cls, df: pd.DataFrame) -> "RuleIndex":
+        index = cls()
+        index.learn(df["Name"], df["Type"])
+        return index
+
+    def learn(self, names: pd.Series, types: pd.Series):
+        pairs = pd.DataFrame({"Name": normalize(names), "Type": types.astype(str)})
+        pairs = pairs[pairs["Name"] != ""]
+        counts = pairs.groupby(["Name", "Type"]).size()
+
+        by_name = defaultdict(Counter)
+        for (name, type_name), count in counts.items():
+            by_name[name][type_name] += count
+        for name, type_counts in by_name.items():
+            self.exact[name] = type_counts.most_common(1)[0][0]
+
+            # node = [children, Type counts of every name below it]
+            node = self.trie
+            for char in name:
+                node = node.setdefault(char, [{}, Counter()])
+                node[1].update(type_counts)
+                node = node[0]
+
+    def prefix_type(self, name: str):
+        node, best = self.trie, None
+        for depth, char in enumerate(name, 1):
+            if char not in node:
+                break
+            children, type_counts = node[char]
+            if depth >= min_prefix:
+                best = type_counts.most_common(1)[0][0]
+            node = children
+        return best
+
+    def rule_type(self, name: str):
+        # the first rule that matches anywhere in the name, not the leftmost match of any rule
+        return next((type_name for type_name, pattern in self.rules if pattern.search(name)), None)
+
+    def categorize(self, names: pd.Series, default: str = "Other") -> pd.Series:
+        codes, uniques = pd.factorize(normalize(names))
+        types = [self.exact.get(name) or self.prefix_type(name) or self.rule_type(name) or default
+                 for name in uniques]
+        return pd.Series(pd.Index(types, dtype=object)[codes] if len(codes) else [], index=names.index, dtype=object)
+
+
+def read_ofx(path) -> pd.DataFrame:
+    """
+    transactions of an .ofx / .qfx file (SGML or XML, closing tags optional), the
+    dates as written in Date Text, Id the account and FITID ('' without one)
+    """
+    text = Path(path).read_text(errors="replace")
+    # FITIDs are only unique within an account, each block belongs to the last account before it
+    accounts = [(match.start(), match.group(1).strip()) for match in re.finditer(r"<ACCTID>([^<\r\n]*)", text, flags=re.I)]
+    rows = []
+    for match in re.finditer(r"<STMTTRN>(.*?)(?:</STMTTRN>|(?=<STMTTRN>)|</BANKTRANLIST>)", text, flags=re.S | re.I):
+        fields = dict((tag.upper(), value.strip()) for tag, value in re.findall(r"<(\w+)>([^<\r\n]*)", match.group(1)))
+        account = next((account for start, account in reversed(accounts) if start < match.start()), "")
+        rows.append({"Date": fields.get("DTPOSTED", "")[:8],
+                     "Name": fields.get("NAME") or fields.get("MEMO", ""),
+                     "Amount": fields.get("TRNAMT", ""),
+                     "Id": f"{account}:{fields['FITID']}" if fields.get("FITID") else ""})
+    df = pd.DataFrame(rows, columns=["Date", "Name", "Amount", "Id"])
+    df["Date Text"] = df["Date"]
+    df["Date"] = pd.to_datetime(df["Date"], format="%Y%m%d", errors="coerce")
+    df["Amount"] = to_cents(df["Amount"])
+    return df
+
+
+def read_statement_csv(path) -> pd.DataFrame:
+    """transactions of a statement .csv, columns found by their usual names, the dates as written in Date Text"""
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    columns = {column.strip().lower(): column for column in df.columns}
+    pick = lambda names: next((columns[name] for name in names if name in columns), None)
+
+    date_column, name_column = pick(date_columns), pick(name_columns)
+    if date_column is None or name_column is None:
+        raise ValueError(f"No date / description column in {Path(path).name}: {list(df.columns)}")
+    if pick(amount_columns) is not None:
+        amounts = to_cents(df[pick(amount_columns)].str.replace(r"[$,\s]", "", regex=True))
+    else:
+        # separate debit / credit columns (or just one of them), debits are money out
+        debit_column, credit_column = pick(("debit", "withdrawal")), pick(("credit", "deposit"))
+        if debit_column is None and credit_column is None:
+            raise ValueError(f"No amount / debit / credit column in {Path(path).name}: {list(df.columns)}")
+        side = lambda column: to_cents(df[column].str.replace(r"[$,\s]", "", regex=True)).fillna(0) \
+            if column is not None else pd.Series(0, index=df.index, dtype="Int64")
+        amounts = side(credit_column) - side(debit_column).abs()
+
+    # each distinct date is parsed once
+    date_text = df[date_column].str.strip()
+    date_codes, dates = pd.factorize(date_text)
+    parsed = pd.to_datetime(pd.Series(dates, dtype=object), format="mixed", errors="coerce")
+    return pd.DataFrame({"Date": parsed.to_numpy()[date_codes] if len(date_codes) else [],
+                         "Name": df[name_column].str.strip(),
+                         "Amount": amounts,
+                         "Date Text": date_text})
+
+
+def read_statement(path) -> pd.DataFrame:
+    if Path(path).suffix.lower() in (".ofx", ".qfx"):
+        return read_ofx(path)
+    return read_statement_csv(path)
+
+
+def statement_expenses(transactions: pd.DataFrame, index: RuleIndex, credits: bool = False) -> pd.DataFrame:
+    """
+    Statement transactions as expense rows (text columns, like insert_expense
+    reads them). Money out is negative on statements, so debits are kept as
+    positive amounts, credits (refunds, pay) only with credits as negative ones.
+    """
+    if not credits:
+        # (amounts are cents, <NA> if they didn't parse, those still go on to be rejected)
+        transactions = transactions[~(transactions["Amount"] > 0).fillna(False)]
+    # a date that didn't parse goes on as written, to be rejected as a bad date (an empty one would be today)
+    unparsed = transactions.get("Date Text", pd.Series("", index=transactions.index, dtype=object)).replace("", "no date")
+    return pd.DataFrame({"Name": transactions["Name"],
+                         "Amount": format_dollars(-transactions["Amount"]),
+                         "Type": index.categorize(transactions["Name"]),
+                         "Date": transactions["Date"].dt.strftime("%m/%d/%Y").fillna(unparsed)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a bank statement (.ofx, .qfx, .csv) into the expense data.")
+    parser.add_argument("statement")
+    parser.add_argument("--dry-run", action="store_true", help="only print the rows that would be imported")
+    parser.add_argument("--credits", action="store_true", help="import credits too (as negative expenses)")
+    parser.add_argument("--quarantine", default=str(insert_expense.data_fp / f"{insert_expense.file_name}.rejected.csv"),
+                        help="where rejected rows are written, with the reason")
+    parser.add_argument("--keep-duplicates", action="store_true",
+                        help="import transactions even if they were imported before (by FITID for .ofx / .qfx, "
+                             "else the same name, amount and date already in the data)")
+    args = parser.parse_args()
+
+    index = RuleIndex.from_ledger(store.read(expense_fp))
+    transactions = read_statement(args.statement)
+    expenses = statement_expenses(transactions, index, args.credits)
+    if args.dry_run:
+        print(expenses.to_string(index=False))
+        return
+    written, rejected = insert_expense.insert_rows(expenses, args.quarantine, dedup=not args.keep_duplicates,
+                                                   ids=transactions.get("Id"))
+    print(f"{written} rows written, {rejected} rejected" + (f" (see {args.quarantine})" if rejected else ""))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,19 @@
 from pathlib import Path
 
+import argparse
 import datetime
 import os
+import sys
 import time
 
+import pandas as pd
+
+import ledger_backup
+import ledger_dedup
+import ledger_io
+from ledger_store import store
+from money import format_dollars, to_cents
+
 data_fp = Path(__file__).parents[1] / "data"
 file_name = "Expenses - Expense_Data.csv"
 file_path = data_fp / file_name
@@ -21,23 +31,20 @@ type_dict = {'0': 'Savings',
 
 today = datetime.datetime.today().date().strftime("%m/%d/%Y")
 
+columns = ["Name", "Amount", "Type", "Date"]
+
 
 def insert_line(line: str, backup: bool = True):
-    with open(file_path, "a") as file:
-        file.write(line)
+    # locked and journaled, safe while the dashboard's editors are saving
+    ledger_io.append(file_path, line.encode())
 
 
 def backup():
     try:
-        backup_file_name = f"{file_name}_{datetime.datetime.today().strftime('%Y%m%d%H%M%S')}.csv"
-        backup_file_dir = data_fp / "backup"
-        if not os.path.isdir(backup_file_dir):
-            os.mkdir(backup_file_dir)
-        with open(os.path.join(backup_file_dir, backup_file_name), "w") as file:
-            with open(file_path, "r") as og_file:
-                file.write(og_file.read())
-                print("Data successfully backed up.\n")
-                return True
+        # deduplicated, see ledger_backup
+        ledger_backup.backup(file_path)
+        print("Data successfully backed up.\n")
+        return True
     except Exception as e:
         print(str(e) + "\n")
         print("Data backup failed.\n")
@@ -58,7 +65,7 @@ def insert_term(insert_input):
         return False
     while not expense_input.replace(".", "").isnumeric():
         expense_input = input("\nExpense Amount? (int or float)\n")
-    line_elements.append(str(float(expense_input)))
+    line_elements.append(format_dollars(to_cents([expense_input])).iloc[0])
 
     # type / category input
     expense_input = input(f"""\nExpense Type?
@@ -80,8 +87,13 @@ def insert_term(insert_input):
         expense_input = today
     line_elements.append(expense_input)
 
+    # same name and amount around that date already in the data?
+    row = pd.DataFrame([line_elements], columns=columns)
+    match = store.ledger(file_path).dedup.check(row.assign(Amount=to_cents(row["Amount"]))).iloc[0]
+    warning = f"\n(possible {match} of an expense already in the data)" if match else ""
+
     # confirming information to insert line into data .csv
-    expense_input = input(f"""\nConfirm expense line (y/n):
+    expense_input = input(f"""\nConfirm expense line (y/n):{warning}
 Name: {line_elements[0]}
 Amount: {line_elements[1]}
 Type: {line_elements[2]}
@@ -99,7 +111,127 @@ Date: {line_elements[3]}\n""")
         return True
 
 
-if __name__ == "__main__":
+def read_rows(source, file_format: str = None) -> pd.DataFrame:
+    """expense rows from a .csv / .jsonl file, or stdin ('-'), all columns as text"""
+    if file_format is None:
+        file_format = "jsonl" if str(source).endswith((".jsonl", ".json")) else "csv"
+    source = sys.stdin if str(source) == "-" else source
+    if file_format == "jsonl":
+        df = pd.read_json(source, lines=True, dtype=False, convert_dates=False)
+    else:
+        df = pd.read_csv(source, dtype=str, keep_default_na=False)
+    df.columns = [str(column).strip().capitalize() for column in df.columns]
+    return df.reindex(columns=columns).astype(object).where(lambda d: d.notna(), "").astype(str)
+
+
+def per_value(series: pd.Series, func) -> pd.Series:
+    """func applied to every distinct value only (exports repeat the same few types and dates)"""
+    codes, uniques = pd.factorize(series)
+    return pd.Series(func(pd.Series(uniques, dtype=object)).to_numpy()[codes], index=series.index)
+
+
+def validate(df: pd.DataFrame) -> tuple:
+    """
+    (good rows, bad rows with a Reason) of imported expenses, checked a column
+    at a time. Type can be the name or its type_dict key, an empty Date is today.
+    The good rows' amounts are in cents.
+    """
+    raw, df = df, df.copy()
+    df["Name"] = df["Name"].str.strip()
+    df["Type"] = per_value(df["Type"], lambda types: types.str.strip().replace(type_dict))
+    amounts = to_cents(df["Amount"].str.strip())
+    df["Date"] = per_value(df["Date"], lambda dates: pd.to_datetime(dates.str.strip().replace("", today),
+                                                                    format="%m/%d/%Y", errors="coerce")
+                           .dt.strftime("%m/%d/%Y"))
+
+    reason = pd.Series("", index=df.index)
+    reason = reason.mask(df["Date"].isna(), "bad date (mm/dd/yyyy)")
+    reason = reason.mask(~df["Type"].isin(type_dict.values()), "unknown type")
+    reason = reason.mask(amounts.isna(), "bad amount")
+    reason = reason.mask(df["Name"] == "", "no name")
+
+    df["Amount"] = amounts
+    good = reason == ""
+    return df.loc[good, columns], raw.loc[~good, columns].assign(Reason=reason[~good])
+
+
+def insert_rows(df: pd.DataFrame, quarantine=None, strict: bool = False, dedup: bool = True,
+                window: int = ledger_dedup.near_days, within_batch: bool = False, ids: pd.Series = None) -> tuple:
+    """
+    Append every valid row (columns Name, Amount, Type, Date as text) to the
+    expense data in one locked write. Bad rows, and with dedup duplicates, go
+    to the quarantine .csv, or with strict nothing is written if there are any.
+    A duplicate is a row with the same name, amount and date as one already in
+    the data (or before it in df, with within_batch), or with ids (transaction
+    ids by row, like OFX FITIDs) one whose id was imported before or repeats
+    in df. Same name and amount within window days (and with ids, the same
+    date too) is only a warning.
+    Returns (rows written, rows rejected).
+    """
+    good, bad = validate(df)
+    if dedup and len(good):
+        matches = store.ledger(file_path).dedup.check(good, window, within_batch)
+        if ids is not None:
+            # the bank says which transactions are the same one, equal rows alone are only a warning
+            good_ids = ids.reindex(good.index).fillna("").astype(str)
+            repeated = (good_ids != "") & (good_ids.isin(ledger_dedup.imported_ids(file_path)) | good_ids.duplicated())
+            matches = matches.replace("duplicate", "near-duplicate").mask(repeated, "duplicate")
+        duplicated = matches == "duplicate"
+        if duplicated.any():
+            duplicates = good[duplicated].assign(Reason=matches[duplicated])
+            bad = pd.concat((bad, duplicates)) if len(bad) else duplicates
+            good = good[~duplicated]
+        near = good[matches.reindex(good.index) == "near-duplicate"]
+        if len(near):
+            print(f"{len(near)} rows look like ones already in the data (written anyway):\n"
+                  + near.to_string(index=False), file=sys.stderr)
+    if len(bad) and quarantine is not None:
+        bad.to_csv(quarantine, mode="a", header=not os.path.exists(quarantine), index=False)
+    if strict and len(bad):
+        return 0, len(bad)
+    if len(good):
+        good = good.assign(Amount=format_dollars(good["Amount"]))
+        ledger_io.append(file_path, good.to_csv(header=False, index=False, lineterminator="\n").encode())
+        if ids is not None:
+            ledger_dedup.add_imported_ids(file_path, ids.reindex(good.index).dropna())
+    return len(good), len(bad)
+
+
+def bulk_insert(source, file_format: str = None, quarantine=None, strict: bool = False, dedup: bool = True,
+                window: int = ledger_dedup.near_days, within_batch: bool = False) -> tuple:
+    """insert_rows of a .csv / .jsonl file (or stdin)"""
+    return insert_rows(read_rows(source, file_format), quarantine, strict, dedup, window, within_batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add expenses, one at a time or a whole file at once.")
+    parser.add_argument("--import", dest="source",
+                        help="import a .csv or .jsonl file of expenses (Name, Amount, Type, Date), '-' for stdin")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="format of the import (default: from the extension)")
+    parser.add_argument("--quarantine", default=str(data_fp / f"{file_name}.rejected.csv"),
+                        help="where rejected rows are written, with the reason")
+    parser.add_argument("--strict", action="store_true", help="import nothing if any row is rejected")
+    parser.add_argument("--keep-duplicates", action="store_true",
+                        help="import rows even if the same name, amount and date is already there")
+    parser.add_argument("--window", type=int, default=ledger_dedup.near_days,
+                        help="days apart that still get a near-duplicate warning (default: %(default)s)")
+    parser.add_argument("--within-import", action="store_true",
+                        help="also count rows repeated within the import as duplicates")
+    parser.add_argument("--backup", action="store_true", help="backup the expense data before importing")
+    args = parser.parse_args()
+
+    if args.source is None:
+        interactive()
+        return
+    if args.backup:
+        backup()
+    written, rejected = bulk_insert(args.source, args.format, args.quarantine, args.strict,
+                                    not args.keep_duplicates, args.window, args.within_import)
+    print(f"{written} rows written, {rejected} rejected" + (f" (see {args.quarantine})" if rejected else ""))
+    sys.exit(1 if rejected and args.strict else 0)
+
+
+def interactive():
     result = True
     while result:
         main_input = input("Expense Name? (Input 'b' to backup data. Input 'q' at any time to quit.)\n")
@@ -111,3 +243,7 @@ if __name__ == "__main__":
             result = insert_term(main_input)
         time.sleep(0.5)
         os.system("cls")
+
+
+if __name__ == "__main__":
+    main()
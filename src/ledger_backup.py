@@ -0,0 +1,210 @@
+"""
+Deduplicated backups of the ledger .csv files. A backup is a small manifest
+(data/backup/<file name>/<timestamp>.json) listing the chunks of the file,
+the chunks themselves are stored once, compressed, under their sha1 in
+data/backup/chunks. Chunks end at lines picked by a hash of the line's
+contents, so appending rows or editing one only adds the chunks around
+the change, the rest of the file is shared with the earlier backups.
+
+Old backups are thinned out to one per hour/day/month (retention), and
+restore() puts the file back as it was at any kept point in time. Backing
+up, thinning and collecting unused chunks hold one lock on data/backup
+(across processes), so chunks a backup is still writing its manifest for
+are never collected.
+"""
+from pathlib import Path
+
+import datetime
+import hashlib
+import json
+import os
+import zlib
+
+import numpy as np
+
+import ledger_io
+
+backup_fp = Path(__file__).parents[1] / "data" / "backup"
+chunk_fp = backup_fp / "chunks"
+lock_fp = backup_fp / "backup.lock"
+
+# ~32KB chunks for ~30 byte lines, never smaller than min_chunk or larger than max_chunk bytes
+boundary_mask = (1 << 10) - 1
+min_chunk, max_chunk = 1 << 12, 1 << 18
+
+# how many of the latest hours/days/months keep a backup, None for all of them
+retention = {"hour": 48, "day": 60, "month": None}
+
+time_format = "%Y%m%d%H%M%S%f"
+
+
+def chunk_bounds(data: bytes) -> list:
+    """end offsets of the chunks of a ledger's bytes"""
+    if not data:
+        return []
+    buffer = np.frombuffer(data + bytes(16), np.uint8)
+    ends = np.flatnonzero(buffer[:len(data)] == ord("\n")) + 1
+    starts = np.r_[0, ends[:-1]]
+
+    # hash of the first and last 8 bytes of every line (all lines at once)
+    window = np.arange(8)
+    head = buffer[starts[:, np.newaxis] + window].copy().view(np.uint64).ravel()
+    tail = buffer[np.maximum(ends - 9, 0)[:, np.newaxis] + window].copy().view(np.uint64).ravel()
+    hashes = ((head * np.uint64(0x9E3779B97F4A7C15)) ^ tail) * np.uint64(0xBF58476D1CE4E5B9) >> np.uint64(40)
+    candidates = ends[(hashes & np.uint64(boundary_mask)) == 0]
+
+    bounds, last = [], 0
+    for end in np.append(candidates, len(data)):
+        # lines longer than max_chunk stay whole
+        while end - last > max_chunk:
+            cut = ends[np.searchsorted(ends, last + max_chunk, side='right') - 1]
+            if cut <= last:
+                break
+            bounds.append(int(cut))
+            last = cut
+        if end - last >= min_chunk or end == len(data):
+            bounds.append(int(end))
+            last = end
+    return bounds
+
+
+def _chunk_path(digest: str) -> Path:
+    return chunk_fp / digest[:2] / digest
+
+
+def _manifest_dir(file_path) -> Path:
+    return backup_fp / Path(file_path).name
+
+
+def snapshots(file_path) -> list:
+    """timestamps of the kept backups of a ledger, oldest first"""
+    manifest_dir = _manifest_dir(file_path)
+    if not manifest_dir.is_dir():
+        return []
+    return sorted(datetime.datetime.strptime(path.stem, time_format) for path in manifest_dir.glob("*.json"))
+
+
+def locked():
+    """exclusive lock of the backup directory, for everything that writes or deletes in it"""
+    backup_fp.mkdir(parents=True, exist_ok=True)
+    return ledger_io.file_lock(lock_fp)
+
+
+def _read_manifest(file_path, timestamp: datetime.datetime) -> dict:
+    with open(_manifest_dir(file_path) / f"{timestamp.strftime(time_format)}.json") as file:
+        return json.load(file)
+
+
+def backup(file_path, now: datetime.datetime = None) -> datetime.datetime:
+    """back up a ledger, only the chunks not stored yet are written. Returns the backup's timestamp."""
+    now = now or datetime.datetime.now()
+    with open(file_path, "rb") as file:
+        data = file.read()
+    with locked():
+        return _backup(file_path, data, now)
+
+
+def _backup(file_path, data: bytes, now: datetime.datetime) -> datetime.datetime:
+    digest = hashlib.sha1(data).hexdigest()
+
+    # nothing changed since the last backup
+    kept = snapshots(file_path)
+    if kept and _read_manifest(file_path, kept[-1])["sha1"] == digest:
+        return kept[-1]
+
+    chunks, start = [], 0
+    for end in chunk_bounds(data):
+        chunk = data[start:end]
+        chunk_digest = hashlib.sha1(chunk).hexdigest()
+        path = _chunk_path(chunk_digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_suffix(".tmp")
+            temp_path.write_bytes(zlib.compress(chunk))
+            os.replace(temp_path, path)
+        chunks.append(chunk_digest)
+        start = end
+
+    manifest_dir = _manifest_dir(file_path)
+    manifest_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = manifest_dir / f"{now.strftime(time_format)}.json"
+    with open(manifest_path.with_suffix(".tmp"), "w") as file:
+        json.dump({"size": len(data), "sha1": digest, "chunks": chunks}, file)
+    os.replace(manifest_path.with_suffix(".tmp"), manifest_path)
+
+    _thin(file_path, now)
+    return now
+
+
+def thinned(timestamps: list, now: datetime.datetime) -> list:
+    """the timestamps the retention policy drops (the newest one per hour/day/month stays)"""
+    keep = set(timestamps[-1:])
+    for period, count in retention.items():
+        seen = []
+        for timestamp in reversed(timestamps):
+            key = {"hour": timestamp.strftime("%Y%m%d%H"),
+                   "day": timestamp.strftime("%Y%m%d"),
+                   "month": timestamp.strftime("%Y%m")}[period]
+            if key in seen:
+                continue
+            if count is not None and len(seen) >= count:
+                break
+            seen.append(key)
+            keep.add(timestamp)
+    # backups in the last hour are all kept
+    keep.update(timestamp for timestamp in timestamps if now - timestamp < datetime.timedelta(hours=1))
+    return [timestamp for timestamp in timestamps if timestamp not in keep]
+
+
+def thin(file_path, now: datetime.datetime = None):
+    """drop the backups the retention policy doesn't keep, and the chunks nothing uses anymore"""
+    with locked():
+        _thin(file_path, now or datetime.datetime.now())
+
+
+def _thin(file_path, now: datetime.datetime):
+    dropped = thinned(snapshots(file_path), now)
+    for timestamp in dropped:
+        (_manifest_dir(file_path) / f"{timestamp.strftime(time_format)}.json").unlink()
+    if dropped:
+        _collect_chunks()
+
+
+def collect_chunks():
+    """delete chunks no backup of any ledger refers to"""
+    with locked():
+        _collect_chunks()
+
+
+def _collect_chunks():
+    used = set()
+    for manifest_path in backup_fp.glob("*/*.json"):
+        with open(manifest_path) as file:
+            used.update(json.load(file)["chunks"])
+    for path in chunk_fp.glob("*/*"):
+        if path.name not in used:
+            path.unlink()
+
+
+def restore(file_path, timestamp: datetime.datetime = None, target=None) -> datetime.datetime:
+    """
+    Put a ledger back as it was at timestamp (the latest backup at or before it,
+    the latest one of all by default). Written through ledger_io, or to target
+    instead of the ledger. Returns the timestamp of the backup used.
+    """
+    # locked so the backup isn't thinned out while its chunks are read
+    with locked():
+        kept = [kept for kept in snapshots(file_path) if timestamp is None or kept <= timestamp]
+        if not kept:
+            raise FileNotFoundError(f"No backup of {Path(file_path).name} at or before {timestamp}")
+        manifest = _read_manifest(file_path, kept[-1])
+        data = b"".join(zlib.decompress(_chunk_path(digest).read_bytes()) for digest in manifest["chunks"])
+    if hashlib.sha1(data).hexdigest() != manifest["sha1"]:
+        raise ValueError(f"Backup {kept[-1]} of {Path(file_path).name} is corrupt")
+
+    if target is not None:
+        Path(target).write_bytes(data)
+    else:
+        with ledger_io.locked(file_path):
+            ledger_io.write(file_path, 0, data)
+    return kept[-1]
@@ -0,0 +1,59 @@
+from pathlib import Path
+
+import json
+
+import pandas as pd
+
+# optional, without pyarrow the ledgers are just parsed from the .csv every cold start
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa, feather = None, None
+
+meta_key = b"qpc"
+# bump whenever the cached columns or meta change, so old caches get ignored
+cache_version = 6
+
+
+def cache_path(file_path: Path) -> Path:
+    """columnar copy sits next to its .csv, e.g. Expenses - Expense_Data.csv.feather"""
+    return Path(file_path).with_name(Path(file_path).name + ".feather")
+
+
+def read_cache(file_path: Path):
+    """
+    (typed frame, metadata it was written with) for a ledger .csv, or None if
+    there's no usable cache. The metadata says which bytes of the .csv the frame
+    covers, so the caller decides if it's still fresh.
+    """
+    path = cache_path(file_path)
+    if feather is None or not path.exists():
+        return None
+    try:
+        table = feather.read_table(path, memory_map=True)
+        meta = json.loads(table.schema.metadata[meta_key])
+        if meta.get("version") != cache_version:
+            return None
+        return table.to_pandas(), meta
+    except Exception:
+        # unreadable/old cache, it just gets rewritten from the .csv
+        return None
+
+
+def write_cache(file_path: Path, df: pd.DataFrame, meta: dict) -> bool:
+    if feather is None:
+        return False
+    path = cache_path(file_path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        table = pa.Table.from_pandas(df)
+        meta = {**meta, "version": cache_version}
+        table = table.replace_schema_metadata({**table.schema.metadata, meta_key: json.dumps(meta).encode()})
+        feather.write_feather(table, tmp_path)
+        tmp_path.replace(path)
+        return True
+    except Exception as e:
+        print(f"Could not write cache for {Path(file_path).name}: {e}")
+        tmp_path.unlink(missing_ok=True)
+        return False
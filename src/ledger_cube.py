@@ -0,0 +1,244 @@
+import numpy as np
+import pandas as pd
+
+from money import cents_array
+
+dow_names = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+# name of the sum of a month's names past the cap (SpendCube's month_cap)
+capped_names = "Other names (capped)"
+
+
+class SpendCube:
+    """
+    Pre-aggregated expense data: the daily sum of every Type, kept as running
+    totals, so the sum over any date range is the difference of two rows
+    instead of a scan over all the expenses. Necesse and day of week are
+    functions of Type and date, so they come out of the same cube (there's one
+    running total per day of week as well). Spending by name can't be
+    pre-summed like that, so there are (Date, Name, Type) rollups per month and
+    per day, sorted by date: whole months in a range come from the monthly one,
+    and only the days at the edges from the daily one. The daily one can be
+    trimmed to the recent days (trim_names), before those a range's edge
+    months count whole. The monthly one can be capped to the month_cap
+    biggest (Name, Type) sums of each month, the rest of a month is one
+    capped_names row per Type (so Type totals stay exact, and the rollup is at
+    most months x (month_cap + types) rows however many names there are).
+    A name that only grows past the cut later keeps the part that was
+    counted as capped_names before.
+
+    All the sums are integer cents, like the ledgers' amounts.
+    """
+    def __init__(self, df: pd.DataFrame, month_cap: int = None):
+        self.types = pd.Index([], dtype=object)
+        self.days = pd.DatetimeIndex([])
+        self.daily = np.zeros((0, 0), dtype=np.int64)
+        self.totals, self.dow_totals = None, None
+        self.names = pd.DataFrame({"Date": pd.Series(dtype="datetime64[ns]"),
+                                   "Name": pd.Series(dtype=object),
+                                   "Type": pd.Series(dtype=object),
+                                   "Amount": pd.Series(dtype=np.int64)})
+        self.month_names = self.names
+        # the daily name rollup starts here, None if it has all the days
+        self.names_from = None
+        # (Name, Type) sums kept per month, None for all of them
+        self.month_cap = month_cap
+        self.fold(df)
+
+    def fold(self, df: pd.DataFrame):
+        """
+        add expenses (typed ledger rows) to the cube, the cost goes with the
+        new rows and the days from the earliest of them on, not with the history
+        """
+        df = df[df["Date"].notna() & df["Type"].notna()]
+        if df.empty:
+            if self.totals is None:
+                self._accumulate(0)
+            return
+
+        # grow the day x type grid at the edges if the new rows are outside it
+        types = self.types.append(pd.Index(df["Type"].cat.categories).difference(self.types))
+        first_new, last_new = df["Date"].min(), df["Date"].max()
+        first, last = first_new, last_new
+        if len(self.days):
+            first, last = min(first, self.days[0]), max(last, self.days[-1])
+        days = pd.date_range(first, last, freq='D')
+        lead = (self.days[0] - first).days if len(self.days) else 0
+        daily = np.pad(self.daily, ((lead, len(days) - lead - len(self.days)), (0, len(types) - len(self.types))))
+
+        # only the days of the new rows are added to
+        start, end = (first_new - first).days, (last_new - first).days + 1
+        day_idx = ((df["Date"] - first_new).dt.days).to_numpy()
+        type_idx = types.get_indexer(df["Type"].cat.categories)[df["Type"].cat.codes.to_numpy()]
+        amounts = cents_array(df["Amount"])
+        # bincount adds up in doubles, exact for whole cents (up to 2**53 of them)
+        daily[start:end] += np.bincount(day_idx * len(types) + type_idx,
+                                        weights=amounts,
+                                        minlength=(end - start) * len(types)).reshape(end - start, -1).astype(np.int64)
+        self.types, self.days, self.daily = types, days, daily
+        # the running totals before the first new day stay as they are (unless days were added in front)
+        self._accumulate(0 if lead or self.totals is None else min(start, len(self.totals) - 1))
+
+        # (grouped while the names are still categorical, the codes are quicker to group by than text)
+        names = pd.Series(amounts, index=df.index, name="Amount") \
+            .groupby([df["Date"], df["Name"], df["Type"].astype(object)], observed=True).sum().reset_index()
+        month_names = names["Amount"].groupby([names["Date"].dt.to_period('M').dt.to_timestamp(), names["Name"],
+                                               names["Type"]], observed=True).sum().reset_index()
+        # the ledger's names are categorical, the rollups keep them as text (one per group, not per row)
+        names["Name"] = names["Name"].astype(object)
+        month_names["Name"] = month_names["Name"].astype(object)
+        # (days before a trimmed daily rollup's start aren't kept anyway)
+        day_names = names if self.names_from is None else names[names["Date"] >= self.names_from]
+        if len(day_names):
+            self.names = self._rollup(self.names, day_names)
+        self.month_names = self._capped(self._rollup(self.month_names, month_names),
+                                        month_names["Date"].iloc[0], month_names["Date"].iloc[-1])
+
+    def _capped(self, month_names: pd.DataFrame, first: pd.Timestamp, last: pd.Timestamp) -> pd.DataFrame:
+        """
+        the month rollup with the sums past month_cap of every month from first
+        to last (the ones just folded into) summed up per Type as capped_names
+        """
+        if self.month_cap is None:
+            return month_names
+        dates = month_names["Date"].to_numpy()
+        start, end = dates.searchsorted(first.to_datetime64()), dates.searchsorted(last.to_datetime64(), side='right')
+        if end - start <= self.month_cap:
+            return month_names
+
+        # rows by month and then amount (biggest first), and how far down its month each one is
+        dates = dates[start:end]
+        order = np.lexsort((-month_names["Amount"].to_numpy()[start:end], dates))
+        position = np.arange(len(order)) - dates.searchsorted(dates[order])
+        if not (position >= self.month_cap).any():
+            return month_names
+        over = np.zeros(len(month_names), dtype=bool)
+        over[start + order[position >= self.month_cap]] = True
+        other = month_names[over].assign(Name=capped_names) \
+            .groupby(["Date", "Name", "Type"], as_index=False)["Amount"].sum()
+        return self._rollup(month_names[~over].reset_index(drop=True), other)
+
+    @staticmethod
+    def _rollup(rollup: pd.DataFrame, names: pd.DataFrame) -> pd.DataFrame:
+        """
+        rollup with names (new (Date, Name, Type) sums, sorted by date like it)
+        added: only the rollup's rows on the new dates are grouped again, the rest
+        is kept as is and the new dates are put in place (appended, when they're
+        after all of it)
+        """
+        keys = ["Date", "Name", "Type"]
+        if rollup.empty:
+            return names
+
+        # rows of the new dates (a run of rows per date, the rollup is sorted by date)
+        dates = rollup["Date"].to_numpy()
+        new_dates = names["Date"].unique()
+        starts, ends = dates.searchsorted(new_dates), dates.searchsorted(new_dates, side='right')
+        counts = ends - starts
+        kept = np.arange(len(rollup))
+        if counts.any():
+            overlap = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            names = pd.concat((rollup.iloc[overlap], names)).groupby(keys, as_index=False)["Amount"].sum()
+            kept = np.delete(kept, overlap)
+        elif names["Date"].iloc[0] > dates[-1]:
+            return pd.concat((rollup, names), ignore_index=True)
+
+        # new rows go in where their dates are (the kept rows don't share a date with them),
+        # one take of the kept rows and the new ones
+        new_at = dates[kept].searchsorted(names["Date"].to_numpy()) + np.arange(len(names))
+        order = np.empty(len(kept) + len(names), dtype=np.int64)
+        is_new = np.zeros(len(order), dtype=bool)
+        is_new[new_at] = True
+        order[new_at] = np.arange(len(rollup), len(rollup) + len(names))
+        order[~is_new] = kept
+        return pd.concat((rollup, names), ignore_index=True).take(order).reset_index(drop=True)
+
+    @staticmethod
+    def _slice(rollup: pd.DataFrame, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        dates = rollup["Date"].to_numpy()
+        return rollup.iloc[dates.searchsorted(np.datetime64(start)):
+                           dates.searchsorted(np.datetime64(end), side='right')]
+
+    def _accumulate(self, start: int):
+        """
+        running totals, with a leading row of zeros so range sums are totals[end] - totals[start],
+        continued from their row start (the days before it didn't change)
+        """
+        # (new arrays, a built view may still hold the old ones)
+        width = ((0, 0), (0, len(self.types) - (0 if self.totals is None else self.totals.shape[1])))
+        kept = np.zeros((1, len(self.types)), dtype=np.int64) if start == 0 else np.pad(self.totals[:start + 1], width)
+        self.totals = np.vstack((kept, kept[-1] + self.daily[start:].cumsum(axis=0)))
+
+        kept = np.zeros((1, 7, len(self.types)), dtype=np.int64) if start == 0 \
+            else np.pad(self.dow_totals[:start + 1], ((0, 0),) + width)
+        by_dow = np.zeros((len(self.days) - start, 7, len(self.types)), dtype=np.int64)
+        by_dow[np.arange(len(by_dow)), self.days[start:].dayofweek] = self.daily[start:]
+        self.dow_totals = np.concatenate((kept, kept[-1] + by_dow.cumsum(axis=0)))
+
+    def _bounds(self, start_date, end_date) -> tuple:
+        start = 0 if start_date is None else self.days.searchsorted(pd.Timestamp(start_date))
+        end = len(self.days) if end_date is None else self.days.searchsorted(pd.Timestamp(end_date), side='right')
+        return start, max(start, end)
+
+    def trim_names(self, since: pd.Timestamp):
+        """drop the daily name rollup before since (it only ever moves forward)"""
+        if self.names_from is not None and since <= self.names_from:
+            return
+        # (names_from first, a reader in between just sees more days than it needs)
+        self.names_from = since
+        self.names = self.names.iloc[self.names["Date"].to_numpy().searchsorted(np.datetime64(since)):]
+
+    def _day_names(self, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        if self.names_from is not None and start <= end and start < self.names_from:
+            # the days were trimmed, it's the whole month then
+            month = start.to_period('M').to_timestamp()
+            return self._slice(self.month_names, month, month)
+        return self._slice(self.names, start, end)
+
+    def months(self) -> pd.DatetimeIndex:
+        """first days of the months with expenses, in order"""
+        return pd.DatetimeIndex(self.month_names["Date"].unique())
+
+    def _type_sums(self, start: int, end: int) -> pd.Series:
+        return pd.Series(self.totals[end] - self.totals[start], index=self.types.rename("Type"), name="Amount")
+
+    def _dow_sums(self, start: int, end: int) -> pd.DataFrame:
+        return pd.DataFrame(self.dow_totals[end] - self.dow_totals[start],
+                            index=pd.Index(dow_names, name="DOW"), columns=self.types.rename("Type"))
+
+    def type_sums(self, start_date=None, end_date=None) -> pd.Series:
+        """total spend per Type between two dates (both included)"""
+        return self._type_sums(*self._bounds(start_date, end_date))
+
+    @staticmethod
+    def by_necesse(type_sums: pd.Series, necesse_dict: dict) -> pd.Series:
+        return type_sums.groupby(type_sums.index.map(necesse_dict).rename("Necesse")).sum()
+
+    def dow_sums(self, start_date=None, end_date=None) -> pd.DataFrame:
+        """total spend per day of week (rows) and Type (columns)"""
+        return self._dow_sums(*self._bounds(start_date, end_date))
+
+    def range_sums(self, start_date=None, end_date=None) -> tuple:
+        """(type_sums, dow_sums, name_sums) of one range, for figures that all show the same dates"""
+        start, end = self._bounds(start_date, end_date)
+        return self._type_sums(start, end), self._dow_sums(start, end), self.name_sums(start_date, end_date)
+
+    def name_sums(self, start_date=None, end_date=None) -> pd.DataFrame:
+        """total spend per (Name, Type) between two dates (both included)"""
+        if not len(self.days):
+            return self.names.groupby(["Name", "Type"], as_index=False)["Amount"].sum()
+        start = self.days[0] if start_date is None else pd.Timestamp(start_date)
+        end = self.days[-1] if end_date is None else pd.Timestamp(end_date)
+
+        # whole months in [first_month, last_month) and single days around them
+        first_month = start.to_period('M').to_timestamp()
+        if first_month < start:
+            first_month += pd.offsets.MonthBegin(1)
+        last_month = (end + pd.Timedelta(days=1)).to_period('M').to_timestamp()
+        if first_month >= last_month:
+            parts = (self._day_names(start, end),)
+        else:
+            parts = (self._day_names(start, first_month - pd.Timedelta(days=1)),
+                     self._slice(self.month_names, first_month, last_month - pd.Timedelta(days=1)),
+                     self._day_names(last_month, end))
+        return pd.concat(parts).groupby(["Name", "Type"], as_index=False)["Amount"].sum()
@@ -0,0 +1,88 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import ledger_io
+from money import cents_array
+
+# rows with the same name and amount this many days apart (or less) are near-duplicates
+near_days = 2
+
+# low bits of a key are the day, the rest a hash of (name, amount)
+day_bits = 21
+day_mask = (1 << day_bits) - 1
+
+
+def row_keys(df: pd.DataFrame) -> np.ndarray:
+    """
+    (name, amount, day) of every row (Amount in cents, like the ledger's) as one
+    integer, names compared without case / outer spaces
+    """
+    # a ledger repeats the same few thousand names, each is cleaned up and hashed once
+    name_codes, names = pd.factorize(df["Name"].astype(str))
+    names = pd.Series(names, dtype=object).str.strip().str.lower().to_numpy(dtype=object)
+    name_hashes = pd.util.hash_array(names)[name_codes] if len(name_codes) else np.zeros(0, np.uint64)
+    cents = cents_array(df["Amount"], missing=-1)
+    name_amount = name_hashes * np.uint64(0x9E3779B97F4A7C15) ^ pd.util.hash_array(cents)
+    dates = df["Date"]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, format="%m/%d/%Y", errors="coerce")
+    days = (dates - pd.Timestamp(0)).dt.days
+    days = days.fillna(day_mask).astype(np.int64).to_numpy().astype(np.uint64) & np.uint64(day_mask)
+    return (name_amount >> np.uint64(day_bits) << np.uint64(day_bits)) | days
+
+
+class DedupIndex:
+    """
+    Keys of all the expense rows in a set, so checking a new row against the
+    whole ledger is a handful of lookups (its day and the days around it)
+    instead of a scan. Kept up to date by the expense ledger as rows are folded in.
+    """
+    def __init__(self, df: pd.DataFrame = None):
+        self.keys = set()
+        if df is not None:
+            self.add(df)
+
+    def add(self, df: pd.DataFrame):
+        self.keys.update(row_keys(df).tolist())
+
+    def match(self, key: int, window: int = near_days) -> str:
+        """'duplicate', 'near-duplicate' or '' for one row key"""
+        if key in self.keys:
+            return "duplicate"
+        for offset in range(1, window + 1):
+            if key + offset in self.keys or ((key & day_mask) >= offset and key - offset in self.keys):
+                return "near-duplicate"
+        return ""
+
+    def check(self, df: pd.DataFrame, window: int = near_days, within_batch: bool = False) -> pd.Series:
+        """
+        'duplicate' / 'near-duplicate' / '' of new rows against the ledger, and
+        with within_batch the new rows before them too (a statement can hold the
+        same fare twice in a day, so that's off by default). The index itself
+        isn't changed.
+        """
+        seen, matches = DedupIndex(), []
+        for key in row_keys(df).tolist():
+            matches.append(self.match(key, window) or (seen.match(key, window) if within_batch else ""))
+            seen.keys.add(key)
+        return pd.Series(matches, index=df.index, dtype=object)
+
+
+def ids_path(file_path) -> Path:
+    file_path = Path(file_path)
+    return file_path.with_name(f"{file_path.name}.ids")
+
+
+def imported_ids(file_path) -> set:
+    """transaction ids (OFX FITIDs) of the rows imported into a ledger so far"""
+    path = ids_path(file_path)
+    return set(path.read_text().splitlines()) if path.exists() else set()
+
+
+def add_imported_ids(file_path, ids):
+    ids = [str(transaction_id) for transaction_id in ids if transaction_id]
+    if ids:
+        with ledger_io.locked(file_path), open(ids_path(file_path), "a") as file:
+            file.write("".join(f"{transaction_id}\n" for transaction_id in ids))
@@ -0,0 +1,189 @@
+"""
+The one write path for the ledger .csv files, used by the Dash editors and
+insert_expense.py alike. Writers take an exclusive lock on a <file>.lock next
+to the ledger, log what they're about to do to a <file>.journal and only
+then touch the file. Readers don't lock: appends only ever add whole lines at
+the end, and anything else is written to a temp file that replaces the ledger
+in one rename, so a reader sees either the old file or the new one.
+
+A journal record is "the file is file[:offset] + data", which can be redone
+any number of times. The journal only ever holds the write in progress, it's
+emptied once the write is done. Every write starts by recovering a record
+left in it (the writer died halfway), so a crash never leaves a torn ledger
+behind.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+
+import datetime
+import json
+import os
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:
+    # windows
+    fcntl = None
+    import msvcrt
+
+
+def lock_path(file_path) -> Path:
+    file_path = Path(file_path)
+    return file_path.with_name(f"{file_path.name}.lock")
+
+
+def journal_path(file_path) -> Path:
+    file_path = Path(file_path)
+    return file_path.with_name(f"{file_path.name}.journal")
+
+
+@contextmanager
+def file_lock(path):
+    """exclusive lock on a lock file, across processes (blocks until the other holder is done)"""
+    with open(path, "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after 10 seconds
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def locked(file_path):
+    """exclusive lock of a ledger's writers (blocks until the other writer is done)"""
+    with file_lock(lock_path(file_path)):
+        recover(file_path)
+        yield
+
+
+def _last_line(file_path: Path) -> bytes:
+    with open(file_path, "rb") as file:
+        end = file.seek(0, os.SEEK_END)
+        position, tail = end, b""
+        while position > 0 and tail.count(b"\n") < 2:
+            step = min(position, 1 << 16)
+            position -= step
+            file.seek(position)
+            tail = file.read(step) + tail
+    return tail.rstrip(b"\n").rsplit(b"\n", 1)[-1]
+
+
+def _log(file_path, record: dict):
+    # replaces whatever was left, recover() already dealt with it
+    with open(journal_path(file_path), "wb") as journal:
+        journal.write(json.dumps(record).encode() + b"\n")
+        journal.flush()
+        os.fsync(journal.fileno())
+
+
+def _clear(file_path):
+    # the write is done (or was never started), nothing to redo
+    with open(journal_path(file_path), "wb"):
+        pass
+
+
+def _apply(file_path: Path, offset: int, data: bytes, replace: bool):
+    if not replace:
+        with open(file_path, "r+b") as file:
+            file.seek(offset)
+            file.write(data)
+            file.truncate()
+            file.flush()
+            os.fsync(file.fileno())
+        return
+
+    temp_path = file_path.with_name(f"{file_path.name}.tmp")
+    with open(file_path, "rb") as file:
+        head = file.read(offset)
+    with open(temp_path, "wb") as file:
+        file.write(head + data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, file_path)
+
+
+def writing(file_path) -> bool:
+    """a write to the ledger is in progress (or was cut off), its journal isn't empty"""
+    try:
+        return os.path.getsize(journal_path(file_path)) > 0
+    except FileNotFoundError:
+        return False
+
+
+def recover(file_path):
+    """redo the write left in the journal, if its writer died halfway (call with the lock held)"""
+    file_path = Path(file_path)
+    if not journal_path(file_path).exists() or not os.path.getsize(journal_path(file_path)):
+        return
+    try:
+        record = json.loads(_last_line(journal_path(file_path)))
+    except ValueError:
+        # torn record, the writer died before the file was touched
+        _clear(file_path)
+        return
+    if "seq" not in record:
+        # commit / abort line of an older journal
+        _clear(file_path)
+        return
+
+    data = record["data"].encode()
+    size = os.path.getsize(file_path)
+    with open(file_path, "rb") as file:
+        file.seek(record["offset"])
+        written = file.read()
+    applied = written == data
+    # an in-place write may have gotten partway
+    partial = not record["replace"] and data.startswith(written) and size >= record["offset"]
+    if not applied:
+        if size != record["base_size"] and not partial:
+            # the file was changed outside of the journal since, leave it be
+            _clear(file_path)
+            return
+        _apply(file_path, record["offset"], data, record["replace"])
+    _clear(file_path)
+
+
+def write(file_path, offset: int, data: bytes, replace: bool = True) -> str:
+    """
+    Make the ledger file[:offset] + data, journaled. replace writes a new file
+    and renames it over the old one, otherwise the bytes are written in place
+    (for appends, offset being the size of the file). Call with the lock held.
+    Returns the journal key of the write (a timestamp).
+    """
+    file_path = Path(file_path)
+    seq = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
+    _log(file_path, {"seq": seq,
+                     "offset": offset,
+                     "base_size": os.path.getsize(file_path),
+                     "replace": replace,
+                     "data": data.decode()})
+    _apply(file_path, offset, data, replace)
+    _clear(file_path)
+    return seq
+
+
+def append(file_path, data: bytes) -> str:
+    """append whole lines to a ledger (adds the missing newline of the last line first)"""
+    with locked(file_path):
+        size = os.path.getsize(file_path)
+        if size:
+            with open(file_path, "rb") as file:
+                file.seek(size - 1)
+                if file.read(1) != b"\n":
+                    data = (b"\r\n" if data.endswith(b"\r\n") else b"\n") + data
+        return write(file_path, size, data, replace=False)
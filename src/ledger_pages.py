@@ -0,0 +1,162 @@
+"""
+Backend paging, sorting and filtering for the cells_* DataTable editors
+(page_action/sort_action/filter_action 'custom'). Pages are served from the
+store's frame, which is sorted by date, so date filters are a binary search
+and the default order needs no sort. Only the rows of the requested page
+are serialized.
+"""
+from functools import lru_cache
+import math
+
+import numpy as np
+import pandas as pd
+
+from ledger_store import store, ledger_columns
+from money import to_dollars
+
+# DataTable filter operators, from the dash docs
+operators = [['ge ', '>='],
+             ['le ', '<='],
+             ['lt ', '<'],
+             ['gt ', '>'],
+             ['ne ', '!='],
+             ['eq ', '='],
+             ['contains '],
+             ['datestartswith ']]
+
+
+def split_filter_part(filter_part: str) -> tuple:
+    """'{Amount} >= 10' -> ('Amount', 'ge', 10.0)"""
+    for operator_type in operators:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+
+                value_part = value_part.strip()
+                v0 = value_part[0] if value_part else ''
+                if v0 and v0 == value_part[-1] and v0 in ("'", '"', '`'):
+                    value = value_part[1: -1].replace('\\' + v0, v0)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+                return name, operator_type[0].strip(), value
+    return None, None, None
+
+
+def date_bounds(operator: str, value) -> tuple:
+    """(start, end) of the dates a Date filter keeps, None for an open end"""
+    day = pd.Timestamp(str(int(value)) if isinstance(value, float) else value).normalize()
+    one_day = pd.Timedelta(days=1)
+    return {'ge': (day, None),
+            'gt': (day + one_day, None),
+            'le': (None, day),
+            'lt': (None, day - one_day),
+            'eq': (day, day)}[operator]
+
+
+def shown(series: pd.Series) -> pd.Series:
+    # amounts are kept in cents, the table shows (and filters and sorts) dollars
+    return to_dollars(series) if series.name == "Amount" else series
+
+
+def column_mask(series: pd.Series, operator: str, value) -> np.ndarray:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        # text filters on dates match them as shown
+        series = series.dt.strftime("%m/%d/%Y")
+    elif isinstance(series.dtype, pd.CategoricalDtype):
+        # names / types are compared as text, not as (unordered) categories
+        series = series.astype(object)
+    if operator in ('contains', 'datestartswith'):
+        # numbers were parsed as floats, 2021 is still matched as "2021"
+        text = str(int(value)) if isinstance(value, float) and value.is_integer() else str(value)
+        if operator == 'contains':
+            return series.astype(str).str.contains(text, case=False, regex=False).to_numpy()
+        return series.astype(str).str.startswith(text).to_numpy()
+    return getattr(series, operator)(value).to_numpy()
+
+
+@lru_cache(maxsize=8)
+def page_order(file_path, version: int, filter_query: str, sort_by: tuple):
+    """
+    Positions (in the store's frame) of the rows a filter keeps, in sort
+    order, or a slice when that's just a range of dates in date order.
+    Cached per ledger version, flipping pages doesn't filter or sort again.
+    """
+    df = store.read(file_path)
+    start, end, masks = None, None, []
+    for filter_part in filter(None, filter_query.split(' && ')):
+        name, operator, value = split_filter_part(filter_part)
+        if name not in ledger_columns:
+            continue
+        try:
+            if name == "Date" and operator in ('ge', 'gt', 'le', 'lt', 'eq'):
+                # date filters narrow the binary searched range
+                low, high = date_bounds(operator, value)
+                start = low if start is None or (low is not None and low > start) else start
+                end = high if end is None or (high is not None and high < end) else end
+            else:
+                masks.append((name, operator, value))
+        except (TypeError, ValueError):
+            # not a valid filter for the column (yet), the table shows it as is
+            continue
+
+    # the date range as positions in the frame
+    dates = df["Date"].to_numpy()
+    first = 0 if start is None else dates.searchsorted(np.datetime64(start))
+    last = len(df) if end is None else dates.searchsorted(np.datetime64(end), side='right')
+    order = slice(first, max(first, last))
+    if not masks and (not sort_by or sort_by == (("Date", "asc"),)):
+        return order
+
+    positions = np.arange(order.start, order.stop)
+    for name, operator, value in masks:
+        try:
+            positions = positions[column_mask(shown(df[name].iloc[positions]), operator, value)]
+        except (TypeError, ValueError):
+            continue
+    for column_id, direction in sort_by:
+        # rows are already in date order, stable sorts keep it between equal values
+        values = shown(df[column_id].iloc[positions])
+        if column_id in ("Name", "Type"):
+            # text is sorted by the codes of its (sorted) categories, not string by string
+            values = pd.Categorical(values.astype(str)).codes
+        positions = positions[np.argsort(np.asarray(values), kind='stable')]
+        if direction == 'desc':
+            positions = positions[::-1]
+    return positions
+
+
+def ledger_page(file_path, page_current: int, page_size: int, sort_by: list, filter_query: str,
+                changes: dict) -> tuple:
+    """
+    Records of one page of a ledger and the number of pages. Unsaved editor
+    changes are laid over the page, rows added in the editor go on the last page.
+    """
+    version, = store.versions(file_path)
+    sort_key = tuple((column["column_id"], column["direction"]) for column in sort_by or [])
+    order = page_order(file_path, version, filter_query or '', sort_key)
+
+    df = store.read(file_path)
+    n_rows = len(range(len(df))[order]) if isinstance(order, slice) else len(order)
+    page_count = max(1, math.ceil(n_rows / page_size))
+    page_current = min(page_current or 0, page_count - 1)
+    start = page_current * page_size
+    if isinstance(order, slice):
+        page = df.iloc[order.start + start:min(order.stop, order.start + start + page_size)]
+    else:
+        page = df.iloc[order[start:start + page_size]]
+
+    page = page[ledger_columns].copy()
+    page["Date"] = page["Date"].dt.strftime("%m/%d/%Y")
+    page["Amount"] = shown(page["Amount"])
+    records = page.rename_axis('id').reset_index().to_dict('records')
+
+    changes = changes or {}
+    rows, deleted = changes.get("rows", {}), set(changes.get("deleted", []))
+    records = [rows.get(str(record['id']), record) for record in records if record['id'] not in deleted]
+    if page_current == page_count - 1:
+        records += [row for row_id, row in rows.items() if int(row_id) < 0]
+    return records, page_count
@@ -0,0 +1,613 @@
+from pathlib import Path
+
+import copy
+import hashlib
+import io
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from ledger_cache import read_cache, write_cache
+import ledger_io
+from ledger_cube import SpendCube
+from ledger_dedup import DedupIndex
+from money import cents_array, format_dollars, to_cents
+
+data_fp = Path(__file__).parents[1] / "data"
+expense_fp = data_fp / "Expenses - Expense_Data.csv"
+income_fp = data_fp / "Expenses - Income_Data.csv"
+budget_fp = data_fp / "Expenses - Budget_Data.csv"
+worth_fp = data_fp / "Quarterly_Worth.csv"
+
+# amounts are parsed as numbers, typed_columns turns them into cents
+ledger_dtypes = {"Name": "category",
+                 "Amount": "float",
+                 "Type": "category",
+                 "Date": "object"}
+ledger_columns = list(ledger_dtypes)
+
+necesse_dict = {"Rent": "Needs",
+                "Utilities": "Needs",
+                "Grocery": "Needs",
+                "Food": "Needs",
+                "Savings": "Savings",
+                "Shop": "Wants",
+                "RecEnt": "Wants",
+                "TransportationT": "Wants",
+                "HealthWell": "Needs",
+                "Other": "Wants"}
+
+def file_signature(file_path) -> tuple:
+    """(mtime, size) of a data file, used to tell if it changed on disk"""
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def date_slice(df: pd.DataFrame, start_date=None, end_date=None, column: str = "Date") -> pd.DataFrame:
+    """
+    Rows of a frame sorted by date between two dates (both included), found
+    by binary search and returned as a slice instead of a filtered copy
+    """
+    if isinstance(df[column].dtype, pd.PeriodDtype):
+        values = df[column].array
+        key = lambda d: pd.Period(d, values.freq)
+    else:
+        # numpy sorts NaT last, same as sort_values
+        values = df[column].to_numpy()
+        key = lambda d: np.datetime64(pd.Timestamp(d))
+    start = 0 if start_date is None else values.searchsorted(key(start_date))
+    end = len(df) if end_date is None else values.searchsorted(key(end_date), side="right")
+    return df.iloc[start:max(start, end)]
+
+
+class Ledger:
+    """
+    One .csv data file, read once and kept in memory until it changes.
+    Typed ledgers are kept sorted by date (the index still being the row
+    in the file), so date ranges are binary searched.
+    """
+    def __init__(self, file_path: Path, dtype: dict = None, transform=None):
+        self.file_path = Path(file_path)
+        self.dtype = dtype
+        self.transform = transform
+        self.signature = None
+        self.version = 0
+        self.df = None
+
+    def stale(self) -> bool:
+        return self.df is None or file_signature(self.file_path) != self.signature
+
+    def load(self):
+        # the new frame replaces the old one whole, readers holding the old one keep it as it was
+        signature = file_signature(self.file_path)
+        cached = read_cache(self.file_path)
+        if cached is not None and cached[1]["signature"] == list(signature):
+            df = cached[0]
+        else:
+            df = pd.read_csv(self.file_path, dtype=self.dtype)
+            if self.transform is not None:
+                df = self.transform(df).sort_values("Date", kind="stable")
+            write_cache(self.file_path, df, {"signature": signature})
+        self.df, self.signature = df, signature
+        self.version += 1
+
+    def frame(self) -> pd.DataFrame:
+        if self.stale():
+            self.load()
+        return self.df
+
+    def invalidate(self):
+        # the frame stays readable until the reload replaces it
+        self.signature = None
+
+
+def typed_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    typed columns, the same for the expense, income and budget data, amounts
+    in integer cents (see money). Nothing derived is kept per row: periods come
+    from the dates (period_ordinals), labels like months or Necesse are made
+    per group (SpendCube)
+    """
+    # a ledger has a few thousand distinct days at most, so each date string is parsed once
+    date_codes, dates = pd.factorize(df["Date"])
+    df["Date"] = pd.to_datetime(dates, format="%m/%d/%Y")[date_codes].where(date_codes >= 0)
+    # names and types repeat, every row is just a small code into their distinct values
+    df["Name"] = df["Name"].astype("category")
+    df["Type"] = df["Type"].astype("category")
+    df["Amount"] = to_cents(df["Amount"])
+    return df
+
+
+def period_ordinals(df: pd.DataFrame, freq: str) -> np.ndarray:
+    """period of every row as an integer (pandas period ordinal), NaT dates are iNaT"""
+    # day and month ordinals are the numpy datetime units (days / months since 1970), no periods needed
+    unit = {"M": "datetime64[M]", "D": "datetime64[D]"}.get(freq)
+    if unit is not None:
+        return df["Date"].to_numpy().astype(unit).view(np.int64)
+    return pd.PeriodIndex(df["Date"], freq=freq).asi8
+
+
+def period_totals(sources: dict, freq: str = "M", start_date=None, end_date=None) -> pd.DataFrame:
+    """
+    Amount total (cents) per period of several ledgers at once, {column: frame} -> one
+    frame indexed by period with a column per ledger. The rows of all the
+    ledgers go through a single bincount keyed on (period, ledger), so a period
+    missing from one ledger is a 0 in its column instead of shifting the others.
+    """
+    frames = [date_slice(df, start_date, end_date) for df in sources.values()]
+    ordinals = np.concatenate([period_ordinals(df, freq) for df in frames])
+    source_idx = np.repeat(np.arange(len(frames)), [len(df) for df in frames])
+    amounts = np.concatenate([cents_array(df["Amount"]) for df in frames])
+
+    dated = ordinals != pd.NaT.value
+    periods, period_idx = np.unique(ordinals[dated], return_inverse=True)
+    # bincount adds up in doubles, exact for whole cents (up to 2**53 of them)
+    totals = np.bincount(period_idx * len(frames) + source_idx[dated],
+                         weights=amounts[dated],
+                         minlength=len(periods) * len(frames)).astype(np.int64)
+    return pd.DataFrame(totals.reshape(len(periods), len(frames)),
+                        index=pd.PeriodIndex(pd.arrays.PeriodArray(periods, dtype=pd.PeriodDtype(freq))),
+                        columns=list(sources))
+
+
+def csv_lines(rows: list, newline: bytes = b"\n") -> bytes:
+    """editor rows (dicts with the ledger columns) as lines of a ledger file"""
+    df = pd.DataFrame(rows, columns=ledger_columns)
+    df["Date"] = pd.to_datetime(df["Date"], format="mixed", errors="coerce").dt.strftime("%m/%d/%Y")
+    df["Amount"] = format_dollars(to_cents(df["Amount"]))
+    return df.to_csv(header=False, index=False, lineterminator=newline.decode()).encode()
+
+
+def row_values(df: pd.DataFrame) -> pd.DataFrame:
+    """ledger rows (text from the file or records from an editor) as values that compare equal if they're the same"""
+    text = lambda column: df[column].astype(object).where(df[column].notna(), "").astype(str)
+    return pd.DataFrame({"Name": text("Name"),
+                         "Amount": to_cents(df["Amount"]),
+                         "Type": text("Type"),
+                         "Date": pd.to_datetime(df["Date"], format="mixed", errors="coerce")}, index=df.index)
+
+
+class RowsChanged(ValueError):
+    """an editor's save of rows that aren't in the file anymore as the editor got them"""
+    def __init__(self, row_ids: list):
+        super().__init__(f"rows changed in the file since they were loaded: {row_ids}")
+        self.row_ids = row_ids
+
+
+class InvalidRows(ValueError):
+    """an editor's save with rows that can't be written as they are"""
+    def __init__(self, reasons: dict):
+        super().__init__(f"rows that can't be saved: {reasons}")
+        self.reasons = reasons
+
+
+def invalid_rows(rows: dict, types) -> dict:
+    """{id: what's wrong} of editor rows ({id: row}) with a bad date or amount, or a type the ledger doesn't have"""
+    if not rows:
+        return {}
+    values = row_values(pd.DataFrame(list(rows.values()), index=list(rows)).reindex(columns=ledger_columns))
+    reason = pd.Series("", index=values.index)
+    reason = reason.mask(~values["Type"].isin(types), "unknown type")
+    reason = reason.mask(values["Amount"].isna().to_numpy(), "bad amount")
+    reason = reason.mask(values["Date"].isna(), "bad date (mm/dd/yyyy)")
+    return reason[reason != ""].to_dict()
+
+
+def stale_rows(data: bytes, line_starts: np.ndarray, row_ids: list, original: dict) -> list:
+    """ids of the rows (of a ledger file's bytes) that don't hold what the editor showed (original, {id: row}) anymore"""
+    n_rows = len(line_starts) - 2
+    stale = [row_id for row_id in row_ids if row_id >= n_rows or row_id not in original]
+    checked = [row_id for row_id in row_ids if row_id not in stale]
+    if not checked:
+        return stale
+    lines = b"".join(data[line_starts[row_id + 1]:line_starts[row_id + 2]] for row_id in checked)
+    current = row_values(pd.read_csv(io.BytesIO(lines), header=None, names=ledger_columns, dtype=str,
+                                     skip_blank_lines=False).set_axis(checked))
+    shown = row_values(pd.DataFrame([original[row_id] for row_id in checked], index=checked).reindex(columns=ledger_columns))
+    same = np.ones(len(checked), dtype=bool)
+    for column in ledger_columns:
+        # missing on both sides is the same too
+        same &= (current[column] == shown[column]).fillna(False).to_numpy(dtype=bool) \
+            | (current[column].isna() & shown[column].isna()).to_numpy()
+    return sorted(stale + [row_id for row_id, kept in zip(checked, same) if not kept])
+
+
+def read_chunks(file_path, dtype: dict = None, chunk_bytes: int = 1 << 22, to_eof: bool = False):
+    """
+    A ledger's rows as raw frames of about chunk_bytes of the file each (whole
+    lines only, a writer might be halfway through the last one, unless to_eof),
+    with the file position after each: (rows, offset). Only one chunk is read
+    at a time.
+    """
+    with open(file_path, "rb") as file:
+        offset = len(file.readline())
+        rest = b""
+        while True:
+            block = file.read(chunk_bytes)
+            data = rest + block
+            end = data.rfind(b"\n") + 1
+            if end:
+                offset += end
+                yield pd.read_csv(io.BytesIO(data[:end]), header=None, names=ledger_columns, dtype=dtype), offset
+            rest = data[end:]
+            if not block:
+                if rest and to_eof:
+                    offset += len(rest)
+                    yield pd.read_csv(io.BytesIO(rest), header=None, names=ledger_columns, dtype=dtype), offset
+                return
+
+
+class ExpenseLedger(Ledger):
+    """
+    Expense data that mostly grows by appending lines (insert_expense), so
+    instead of re-reading the whole file only the new tail gets parsed and
+    folded into the kept aggregates. If the file was rewritten instead
+    (different inode, shorter, or the start of it or the lines just before the
+    new ones changed) it's fully reloaded.
+
+    Files bigger than stream_bytes are streamed: read a chunk at a time into
+    the aggregates, with only the latest window_rows rows (by date) kept as the
+    frame and the monthly name rollup capped to month_cap names a month. What's
+    kept is then a chunk, the window, the day x type grid and at most
+    months x (month_cap + types) name sums: it grows with the days and months
+    the history spans, not with the rows in them.
+    """
+    prefix_bytes = 1 << 16
+    stream_bytes = 1 << 28
+    window_rows = 1 << 18
+    month_cap = 1000
+
+    def __init__(self, file_path: Path, dtype: dict = None):
+        super().__init__(file_path, dtype, typed_columns)
+        self.inode = None
+        self.offset = 0
+        self.edge_hash = None
+        self.rows = 0
+        self.cube = None
+        self._dedup = None
+        # rows kept as the frame, None for all of them
+        self.window = None
+
+    def _read_lines(self, file, start: int, to_eof: bool = False) -> bytes:
+        # only whole lines, a writer might be halfway through the last one
+        file.seek(start)
+        data = file.read()
+        if to_eof and not ledger_io.writing(self.file_path):
+            # unless it's a full load and nobody's writing, then a last line without its newline is a row too
+            return data
+        return data[:data.rfind(b"\n") + 1]
+
+    def _edge_hash(self, file, offset: int) -> str:
+        # sha1 of the first and of the last prefix_bytes before offset, so an edit at
+        # either end of what was read (then grown past offset) doesn't pass as an append
+        file.seek(0)
+        head = file.read(min(offset, self.prefix_bytes))
+        file.seek(max(offset - self.prefix_bytes, 0))
+        return hashlib.sha1(head + file.read(min(offset, self.prefix_bytes))).hexdigest()
+
+    def load(self):
+        stat = os.stat(self.file_path)
+        if stat.st_size > self.stream_bytes:
+            self.stream(stat)
+            return
+        self.window = None
+        self.inode = stat.st_ino
+        self.signature = stat.st_mtime_ns, stat.st_size
+
+        # the columnar cache is good as is if the .csv hasn't changed since it was written
+        cached = read_cache(self.file_path)
+        if cached is not None and cached[1]["signature"] == list(self.signature):
+            self.df, meta = cached
+            self.offset, self.rows, self.edge_hash = meta["offset"], meta["rows"], meta["edge_hash"]
+            self.aggregate()
+            self.version += 1
+            return
+
+        with open(self.file_path, "rb") as file:
+            data = self._read_lines(file, 0, to_eof=True)
+        if cached is not None and len(data) >= cached[1]["offset"] \
+                and hashlib.sha1(data[:cached[1]["offset"]]).hexdigest() == cached[1]["sha1"]:
+            # or the .csv was only appended to since, then just the tail is parsed
+            self.df, meta = cached
+            self.offset, self.rows = meta["offset"], meta["rows"]
+            self.aggregate()
+            if len(data) > self.offset:
+                self.fold(pd.read_csv(io.BytesIO(data[self.offset:]), header=None, names=ledger_columns, dtype=self.dtype))
+        else:
+            self.df = self.transform(pd.read_csv(io.BytesIO(data), dtype=self.dtype)).sort_values("Date", kind="stable")
+            self.rows = len(self.df)
+            self.aggregate()
+        self.offset = len(data)
+        self.edge_hash = self._edge_hash(io.BytesIO(data), self.offset)
+        self.version += 1
+
+        write_cache(self.file_path, self.df, {"signature": self.signature,
+                                              "offset": self.offset,
+                                              "rows": self.rows,
+                                              "sha1": hashlib.sha1(data).hexdigest(),
+                                              "edge_hash": self.edge_hash})
+
+    def stream(self, stat: os.stat_result):
+        """load the file a chunk at a time (see read_chunks), folding each into new aggregates"""
+        # built aside and swapped in at the end, readers keep the old frame until then
+        loaded = ExpenseLedger(self.file_path, self.dtype)
+        loaded.window = self.window_rows
+        offset = 0
+        for rows, offset in read_chunks(self.file_path, self.dtype, to_eof=not ledger_io.writing(self.file_path)):
+            if loaded.df is None:
+                loaded.rows = len(rows)
+                loaded.df = loaded.transform(rows).sort_values("Date", kind="stable")
+                loaded.aggregate()
+                loaded.df = loaded.df.iloc[-self.window_rows:]
+                loaded._trim_names(loaded.cube)
+            else:
+                loaded.fold(rows)
+        if loaded.df is None:
+            # header only
+            loaded.df = self.transform(pd.DataFrame({column: pd.Series(dtype=dtype)
+                                                     for column, dtype in ledger_dtypes.items()}))
+            loaded.aggregate()
+
+        with open(self.file_path, "rb") as file:
+            self.edge_hash = self._edge_hash(file, offset)
+        self.df, self.cube, self._dedup = loaded.df, loaded.cube, None
+        self.rows, self.offset, self.window = loaded.rows, offset, self.window_rows
+        self.inode, self.signature = stat.st_ino, (stat.st_mtime_ns, stat.st_size)
+        self.version += 1
+
+    def aggregate(self):
+        self.cube = SpendCube(self.df, self.month_cap if self.window is not None else None)
+        self._dedup = None
+
+    def _trim_names(self, cube: SpendCube):
+        # names per day are only kept as far back as the window goes
+        first = self.df["Date"].iloc[0] if len(self.df) else pd.NaT
+        if pd.notna(first):
+            cube.trim_names(first)
+
+    @property
+    def dedup(self) -> DedupIndex:
+        """duplicate index of the rows (of the window, if streamed), built on first use (only ingest needs it)"""
+        # rows appended since the last look are folded into the index (a rewrite drops it)
+        df = self.frame()
+        if self._dedup is None:
+            self._dedup = DedupIndex(df)
+        return self._dedup
+
+    def frame(self) -> pd.DataFrame:
+        if self.df is None or self.signature is None:
+            self.load()
+            return self.df
+
+        stat = os.stat(self.file_path)
+        if (stat.st_mtime_ns, stat.st_size) == self.signature:
+            return self.df
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            self.load()
+            return self.df
+
+        with open(self.file_path, "rb") as file:
+            if self._edge_hash(file, self.offset) != self.edge_hash:
+                self.load()
+                return self.df
+            data = self._read_lines(file, self.offset)
+            if data:
+                # the next check is against the edges of what's been read by then
+                self.edge_hash = self._edge_hash(file, self.offset + len(data))
+        self.signature = stat.st_mtime_ns, stat.st_size
+        if data:
+            self.offset += len(data)
+            self.fold(pd.read_csv(io.BytesIO(data), header=None, names=ledger_columns, dtype=self.dtype))
+        return self.df
+
+    def fold(self, rows: pd.DataFrame):
+        """add appended rows to the frame and the aggregates"""
+        rows.index += self.rows
+        self.rows += len(rows)
+        rows = self.transform(rows)
+
+        # keep Name and Type categorical across the old rows and the new ones
+        # (on a shallow copy, the old frame may still be read by someone)
+        df = self.df
+        for column in ("Name", "Type"):
+            new_categories = rows[column].cat.categories.difference(df[column].cat.categories)
+            dtype = df[column].cat.add_categories(new_categories).dtype
+            if len(new_categories):
+                df = df.copy(deep=False) if df is self.df else df
+                df[column] = df[column].astype(dtype)
+            rows[column] = rows[column].astype(dtype)
+        rows = rows.sort_values("Date", kind="stable")
+        if len(df) and len(rows) and not rows["Date"].iloc[0] >= df["Date"].iloc[-1]:
+            # back-dated rows, merge them in (stable, so earlier rows of a day stay first)
+            self.df = pd.concat((df, rows)).sort_values("Date", kind="stable")
+        else:
+            self.df = pd.concat((df, rows))
+        if self.window is not None:
+            self.df = self.df.iloc[-self.window:]
+
+        # SpendCube.fold replaces its arrays instead of writing into them, so folding
+        # into a copy leaves the cube a built view holds as it was
+        cube = copy.copy(self.cube)
+        cube.fold(rows)
+        if self.window is not None:
+            self._trim_names(cube)
+        self.cube = cube
+        if self._dedup is not None:
+            self._dedup.add(rows)
+        self.version += 1
+
+
+class LedgerStore:
+    """
+    Process-wide cache of the ledgers and of anything derived from them.
+    Every page reads through here so a dataset is only parsed again when
+    its file changes (or an editor invalidates it after saving).
+
+    With a worker running (ledger_worker) reads never reload or rebuild
+    anything, they get the last finished frame / view, and the worker
+    refreshes them in the background.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.ledgers = {}
+        # key -> (versions, object, builder, file paths, token)
+        self.views = {}
+        # key -> functions called after the worker rebuilt that view
+        self.hooks = {}
+        self.worker = None
+        # set to have the worker refresh now instead of at its next poll
+        self.changed = threading.Event()
+
+    def ledger(self, file_path) -> Ledger:
+        file_path = Path(file_path)
+        ledger = self.ledgers.get(file_path)
+        if ledger is not None:
+            return ledger
+        with self._lock:
+            if file_path not in self.ledgers:
+                if file_path == expense_fp:
+                    self.ledgers[file_path] = ExpenseLedger(file_path, ledger_dtypes)
+                elif file_path == worth_fp:
+                    self.ledgers[file_path] = Ledger(file_path)
+                else:
+                    self.ledgers[file_path] = Ledger(file_path, ledger_dtypes, typed_columns)
+            return self.ledgers[file_path]
+
+    def read(self, file_path) -> pd.DataFrame:
+        """shared raw frame of a ledger, treat as read-only (copy before mutating)"""
+        ledger = self.ledger(file_path)
+        if self.worker is not None and ledger.df is not None:
+            # kept up to date by the worker, don't wait on a reload it may be doing
+            return ledger.df
+        with self._lock:
+            return ledger.frame()
+
+    def versions(self, *file_paths) -> tuple:
+        for file_path in file_paths:
+            self.read(file_path)
+        return tuple(self.ledger(file_path).version for file_path in file_paths)
+
+    def _view_versions(self, file_paths: tuple, token) -> tuple:
+        return token() if callable(token) else token, self.versions(*file_paths)
+
+    def view(self, key, builder, *file_paths, token=None):
+        """
+        Object built by builder() from the given ledgers, e.g. a MoneyDash.
+        Only rebuilt when one of the ledgers changed, or the token did (a
+        value, or a function returning it like datetime.date.today).
+        """
+        cached = self.views.get(key)
+        if self.worker is not None and cached is not None:
+            return cached[1]
+        with self._lock:
+            versions = self._view_versions(file_paths, token)
+            cached = self.views.get(key)
+            if cached is None or cached[0] != versions:
+                cached = (versions, builder(), builder, file_paths, token)
+                self.views[key] = cached
+            return cached[1]
+
+    def on_refresh(self, key, hook):
+        """have hook() called after the worker rebuilt the view key (e.g. to warm the figure cache)"""
+        self.hooks.setdefault(key, []).append(hook)
+
+    def refresh(self) -> list:
+        """
+        Reload the ledgers whose files changed and rebuild the views built on
+        them. A rebuilt view is swapped in with one assignment, so readers get
+        either the old one or the new one. Returns the keys of the rebuilt views.
+        """
+        rebuilt = []
+        with self._lock:
+            for ledger in list(self.ledgers.values()):
+                ledger.frame()
+            for key, (versions, _, builder, file_paths, token) in list(self.views.items()):
+                current = self._view_versions(file_paths, token)
+                if current != versions:
+                    self.views[key] = (current, builder(), builder, file_paths, token)
+                    rebuilt.append(key)
+        for key in rebuilt:
+            for hook in self.hooks.get(key, []):
+                hook()
+        return rebuilt
+
+    def apply_changes(self, file_path, rows: dict, deleted: list, original: dict) -> dict:
+        """
+        Write an editor's row changes to a ledger file. rows is {id: row}, with
+        the row in the file as id for updated rows and negative ids for inserted
+        ones (in the order they were added: -1, -2, ...), deleted a list of ids,
+        original {id: row} the updated / deleted rows as the editor got them.
+        Inserted rows are appended, the file is only rewritten from the first
+        updated/deleted row on (into a new file renamed over the old one),
+        through ledger_io's lock and journal. Returns the deleted ids and the ids the inserted
+        rows got, the ids of the rows after a deleted one shift down.
+
+        Ids are rows of the file as the editor loaded it, so if any of those
+        rows isn't the same anymore (another tab saved first, shifting or
+        changing them) nothing is written and RowsChanged is raised. Nothing
+        is written either if a row has a bad date, amount or type (InvalidRows).
+        """
+        file_path = Path(file_path)
+        rows = {int(row_id): row for row_id, row in rows.items()}
+        reasons = invalid_rows(rows, self.read(file_path)["Type"].cat.categories)
+        if reasons:
+            raise InvalidRows(reasons)
+        original = {int(row_id): row for row_id, row in original.items()}
+        inserted = sorted((row_id for row_id in rows if row_id < 0), reverse=True)
+        with self._lock, ledger_io.locked(file_path):
+            with open(file_path, "rb") as file:
+                data = file.read()
+            size = len(data)
+            first = data.find(b"\n")
+            newline = b"\r\n" if first > 0 and data[first - 1:first] == b"\r" else b"\n"
+            if not data.endswith(b"\n"):
+                data += newline
+
+            # line_starts[k + 1] is where row k starts (line 0 is the header)
+            line_starts = np.r_[0, np.flatnonzero(np.frombuffer(data, np.uint8) == ord("\n")) + 1]
+            n_rows = len(line_starts) - 2
+            changed = sorted({int(row_id) for row_id in deleted} | {row_id for row_id in rows if row_id >= 0})
+            stale = stale_rows(data, line_starts, changed, original)
+            if stale:
+                raise RowsChanged(stale)
+            deleted = sorted({int(row_id) for row_id in deleted if 0 <= int(row_id) < n_rows})
+            updated = {row_id: row for row_id, row in rows.items() if 0 <= row_id < n_rows and row_id not in deleted}
+
+            # copy the untouched spans between the changed rows as they are
+            start = line_starts[min(deleted + list(updated), default=n_rows) + 1]
+            position, parts = start, []
+            for row_id in sorted(set(deleted) | set(updated)):
+                parts.append(data[position:line_starts[row_id + 1]])
+                if row_id in updated:
+                    parts.append(csv_lines([updated[row_id]], newline))
+                position = line_starts[row_id + 2]
+            parts.append(data[position:])
+            parts.append(csv_lines([rows[row_id] for row_id in inserted], newline))
+
+            write_from = int(min(start, size))
+            ledger_io.write(file_path, write_from, data[write_from:start] + b"".join(parts),
+                            replace=bool(deleted or updated))
+
+            # appended lines are picked up by the ledger itself, anything else is a reload
+            ledger = self.ledger(file_path)
+            if deleted or updated:
+                ledger.invalidate()
+            if self.worker is not None:
+                # the editor reads its save back right away, the worker rebuilds the views
+                ledger.frame()
+                self.changed.set()
+            first_new = n_rows - len(deleted)
+            return {"deleted": deleted,
+                    "inserted": {row_id: first_new + i for i, row_id in enumerate(inserted)}}
+
+    def invalidate(self, file_path=None):
+        with self._lock:
+            ledgers = self.ledgers.values() if file_path is None else [self.ledger(file_path)]
+            for ledger in ledgers:
+                ledger.invalidate()
+        self.changed.set()
+
+
+store = LedgerStore()
@@ -0,0 +1,51 @@
+"""
+Background refresh of the ledger store. A daemon thread looks at the ledger
+files every few seconds (or right away when an editor saved) and, when one
+changed, reloads it and rebuilds the views built on it (MoneyDash and its
+aggregate tables, ...) off the request path. The new view replaces the old
+one whole, so page callbacks always read a finished snapshot and never wait
+on a parse or a rebuild themselves.
+"""
+import logging
+import threading
+
+from ledger_store import LedgerStore, store
+
+# seconds between two looks at the data files
+poll_interval = 2.0
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshWorker(threading.Thread):
+    def __init__(self, ledger_store: LedgerStore, interval: float = poll_interval):
+        super().__init__(name="ledger-refresh", daemon=True)
+        self.store = ledger_store
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.store.changed.wait(self.interval)
+            self.store.changed.clear()
+            if self.stopped.is_set():
+                break
+            try:
+                # a stat of every loaded ledger, anything only gets rebuilt if a file (or the day) changed
+                self.store.refresh()
+            except Exception:
+                # e.g. a file being replaced by hand, the next poll tries again
+                logger.exception("Refreshing the ledgers failed")
+
+    def stop(self):
+        self.stopped.set()
+        self.store.changed.set()
+        self.join()
+
+
+def start(ledger_store: LedgerStore = store, interval: float = poll_interval) -> RefreshWorker:
+    """start refreshing a store in the background (once, later calls return the running worker)"""
+    if ledger_store.worker is None:
+        ledger_store.worker = RefreshWorker(ledger_store, interval)
+        ledger_store.worker.start()
+    return ledger_store.worker
@@ -0,0 +1,43 @@
+"""
+Amounts as integer cents (int64). They're turned into cents once, where they
+come in (ledger files, imports, typed input), added up as integers from there
+on (exact, no rounding passes, no drift over long histories), and only turned
+back into dollars to be shown or written out.
+"""
+import numpy as np
+import pandas as pd
+
+
+def to_cents(amounts) -> pd.Series:
+    """
+    dollar amounts (numbers or text) as a nullable Int64 series of cents,
+    anything that isn't a number is <NA>
+    """
+    # a double is off by far less than half a cent for any amount a ledger has,
+    # so rounding it x100 gives exactly the cents that were written
+    dollars = pd.to_numeric(pd.Series(amounts), errors="coerce").astype(float)
+    cents = np.rint(dollars.to_numpy() * 100)
+    # inf, nan and amounts past what int64 cents hold aren't numbers either
+    with np.errstate(invalid="ignore"):
+        cents[~(np.abs(cents) < 2.0 ** 63)] = np.nan
+    return pd.Series(cents, index=dollars.index).astype("Int64")
+
+
+def cents_array(cents, missing: int = 0) -> np.ndarray:
+    """cents (Int64 series or anything array-like) as a plain int64 array, <NA> as missing"""
+    return pd.array(cents, dtype="Int64").to_numpy(dtype=np.int64, na_value=missing)
+
+
+def to_dollars(cents):
+    """cents (series, frame, array or a number) in dollars as floats, only for showing them"""
+    return cents.astype(float) / 100 if hasattr(cents, "astype") else cents / 100
+
+
+def format_dollars(cents) -> pd.Series:
+    """cents as dollar text, 1250 -> '12.50', -5 -> '-0.05', <NA> -> ''"""
+    cents = pd.Series(cents, dtype="Int64")
+    values = cents_array(cents)
+    whole, part = np.divmod(np.abs(values), 100)
+    text = pd.Series(np.where(values < 0, "-", ""), index=cents.index, dtype=object) \
+        + whole.astype(str).astype(object) + "." + pd.Series(part, index=cents.index).astype(str).str.zfill(2)
+    return text.where(cents.notna(), "")
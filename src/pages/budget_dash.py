@@ -1,19 +1,24 @@
 import datetime
 import warnings
-from pathlib import Path
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
 # dash and plotly
 import dash
-from dash import Dash, html, dcc, Input, Output, callback
+from dash import Dash, html, dcc, Input, Output, State, callback, clientside_callback, ctx, no_update
+import dash_daq as daq
 import plotly.express as px
-import plotly.graph_objects as go
 
 # data
+import numpy as np
 import pandas as pd
 from datetime import date
 import calendar
-pd.options.mode.chained_assignment = None
+from ledger_cube import SpendCube
+from ledger_store import store, expense_fp, income_fp, budget_fp, necesse_dict, date_slice, period_totals
+from figure_cache import cached_figure
+from figure_payload import compact_template
+from range_figures import render_range
+from money import cents_array, to_dollars
 
 # register page in app
 dash.register_page(__name__, path="/",
@@ -53,310 +58,174 @@ class MoneyDash:
 
         self.month_dict = {month: idx + 1 for idx, month in enumerate(self.month_list)}
 
-        self.necesse_dict = {"Rent": "Needs",
-                             "Utilities": "Needs",
-                             "Grocery": "Needs",
-                             "Food": "Needs",
-                             "Savings": "Savings",
-                             "Shop": "Wants",
-                             "RecEnt": "Wants",
-                             "TransportationT": "Wants",
-                             "HealthWell": "Needs",
-                             "Other": "Wants"}
+        self.necesse_dict = necesse_dict
 
         self.necesse_color_dict = {"Needs": "purple",
                                    "Savings": "green",
                                    "Wants": "red"}
 
+        # types only shown in the legend at first
+        self.legend_hidden = ("Rent", "Savings", "Utilities")
+
+        # names shown by the name figure at a time, the rest are one "Other names" bar
+        self.name_top_n = 40
+        self.other_names = "Other names"
+
+        # frequency -> (pandas period, x-axis name), the periods are labelled in range_figures
+        self.frequency_dict = {"Yearly": ("Y", "Year"),
+                               "Quarterly": ("Q", "Quarter"),
+                               "Monthly": ("M", "Month-Year"),
+                               "Weekly": ("W", "Week"),
+                               "Daily": ("D", "Day")}
+
         # month years
         self.month_year_list = None
 
         # dataframes
         self.df_expense, self.df_income, self.df_budget = None, None, None
-        self.df_expense_group_sum, \
-            self.df_income_group_sum, \
-            self.df_income_now_group_sum, \
-            self.df_budget_group_sum = None, None, None, None
-        self.df_all_group_sum = None
+        self.expense_cube = None
+        self._spending_series = None
+        self.versions = {}
         self.load_data()
 
         # years
-        self.year_list = list(self.df_expense["Year"].sort_values(ascending=False).unique())
+        self.year_list = list(self.expense_cube.months().year.unique()[::-1])
 
     def load_data(self):
-        # Load data
-        data_fp = Path(__file__).parents[2] / "data"
-        expense_fp = data_fp / "Expenses - Expense_Data.csv"
-        income_fp = data_fp / "Expenses - Income_Data.csv"
-        budget_fp = data_fp / "Expenses - Budget_Data.csv"
-
-        self.df_expense = pd.read_csv(expense_fp, dtype={"Name": "object",
-                                                         "Amount": "float",
-                                                         "Type": "category",
-                                                         "Date": "object"})
-        self.df_income = pd.read_csv(income_fp, dtype={"Name": "object",
-                                                       "Amount": "float",
-                                                       "Type": "category",
-                                                       "Date": "object"})
-        self.df_budget = pd.read_csv(budget_fp, dtype={"Name": "object",
-                                                       "Amount": "float",
-                                                       "Type": "category",
-                                                       "Date": "object"})
-        # expense data
-        self.df_expense["Date"] = pd.to_datetime(self.df_expense["Date"])
-        self.df_expense["Type"] = self.df_expense["Type"].astype("category")
-        self.df_expense["Year-Month"] = self.df_expense["Date"].dt.to_period('M')
-        self.df_expense["Month-Year"] = self.df_expense["Year-Month"].dt.strftime("%b-%Y")
-        self.df_expense["Year"] = self.df_expense["Date"].dt.year
-        self.df_expense["Day"] = self.df_expense["Date"].dt.to_period('D')
-        self.df_expense["FOM"] = self.df_expense["Month-Year"].apply(lambda d: datetime.datetime.strptime(d, "%b-%Y").date())
-        self.df_expense["Necesse"] = self.df_expense["Type"].apply(lambda t: self.necesse_dict.get(t))
-        self.df_expense_group_sum = self.df_expense.rename(columns={"Amount": "Expense_Total"}) \
-            .groupby(["Year-Month", "Month-Year", "FOM", "Year"], as_index=False, observed=False)["Expense_Total"].sum()
+        # ledger versions this was built from, figures are cached per version
+        self.versions = dict(zip((expense_fp, income_fp, budget_fp), store.versions(expense_fp, income_fp, budget_fp)))
 
-        # set month_year list
-        self.month_year_list = list(self.df_expense["Month-Year"].unique())
-
-        # income data
-        self.df_income["Date"] = pd.to_datetime(self.df_income["Date"])
-        self.df_income["Year-Month"] = pd.to_datetime(self.df_income["Date"]).dt.to_period('M')
-        self.df_income["Month-Year"] = self.df_income["Year-Month"].dt.strftime("%b-%Y")
-        self.df_income["Year"] = self.df_income["Date"].dt.year
-        self.df_income["FOM"] = self.df_income["Month-Year"].apply(lambda d: datetime.datetime.strptime(d, "%b-%Y").date())
-        self.df_income_group_sum = self.df_income.rename(columns={"Amount": "Income_Total"}) \
-            .groupby(["Year-Month", "Month-Year", "FOM", "Year"], as_index=False, observed=False)["Income_Total"].sum()
-        self.df_income_now_group_sum = self.df_income[self.df_income["Date"] <= self.today] \
-            .rename(columns={"Amount": "Income_Now"}) \
-            .groupby(["Year-Month", "Month-Year", "FOM", "Year"], as_index=False, observed=False)["Income_Now"].sum()
-
-        # budget data
-        self.df_budget["Date"] = pd.to_datetime(self.df_budget["Date"])
-        self.df_budget["Year-Month"] = pd.to_datetime(self.df_budget["Date"]).dt.to_period('M')
-        self.df_budget["Month-Year"] = self.df_budget["Year-Month"].dt.strftime("%b-%Y")
-        self.df_budget["Year"] = self.df_budget["Date"].dt.year
-        self.df_budget["FOM"] = self.df_budget["Month-Year"].apply(lambda d: datetime.datetime.strptime(d, "%b-%Y").date())
-        self.df_budget_group_sum = self.df_budget.rename(columns={"Amount": "Budget_Total"}) \
-            .groupby(["Year-Month", "Month-Year", "FOM", "Year"], as_index=False, observed=False)["Budget_Total"].sum()
-
-        # combine all month sums (expense, income, budget)
-        self.df_all_group_sum = pd.concat((self.df_expense_group_sum,
-                                           self.df_income_group_sum["Income_Total"],
-                                           self.df_income_now_group_sum["Income_Now"],
-                                           self.df_budget_group_sum["Budget_Total"]),
-                                           axis=1)
-
-    def create_range_spend_figs(self, start_date: datetime.date, end_date: datetime.date, freq: str = 'Monthly'):
-        if freq == 'Monthly':
-            # clip'd
-            df_all_group_sum = self.df_all_group_sum[self.df_all_group_sum["FOM"].between(start_date, end_date)]
-            month_expense_sums = self.df_expense_group_sum[self.df_expense_group_sum["FOM"].between(start_date, end_date)]
-            month_expense_sums["Month-Year"] = month_expense_sums["Year-Month"].dt.strftime("%b-%Y")
-
-            # group by type and aggregate for each month
-            month_group_sums = self.df_expense[self.df_expense["FOM"].between(start_date, end_date)].groupby(["Year-Month", "Type"], observed=False)["Amount"].sum().round(2).reindex(
-                self.sorted_names, level='Type').reset_index()
-            month_group_sums["Month-Year"] = month_group_sums["Year-Month"].dt.strftime("%b-%Y")
-
-            # create main time-series expense figure
-            fig = px.bar(month_group_sums, x='Month-Year', y='Amount', color='Type', barmode='stack',
-                         color_discrete_map=self.color_dict,
-                         hover_data={'Type': False,
-                                     'Month-Year': False},
-                         labels={'Amount': "Amount ($)"})
-
-            # format hover values to two decimal point floats
-            fig.update_traces(hovertemplate="%{y:$.2f}<extra></extra>")
-
-            # add time-series scatter traces for income and budget over time
-            # dashed lines with markers representing income and budget boundaries
-            fig.add_trace(go.Scatter(x=df_all_group_sum["Month-Year"], y=df_all_group_sum["Income_Now"],
-                                     mode='lines+markers',
-                                     name='Present Income', line=dict(color='blueviolet', width=4, dash='dash'),
-                                     hovertemplate="%{y:$.2f}<extra></extra>"))
-            fig.add_trace(go.Scatter(x=df_all_group_sum["Month-Year"], y=df_all_group_sum["Income_Total"],
-                                     mode='lines+markers',
-                                     name='Total Income', line=dict(color='blue', width=4, dash='dash'),
-                                     hovertemplate="%{y:$.2f}<extra></extra>"))
-            fig.add_trace(go.Scatter(x=df_all_group_sum["Month-Year"], y=df_all_group_sum["Budget_Total"],
-                                     mode='lines+markers',
-                                     name='Budget', line=dict(color='skyblue', width=4, dash='dash'),
-                                     hovertemplate="%{y:$.2f}<extra></extra>"))
-
-            # iterate over month sums for all three amounts (expense, income, budget)
-            for idx, row in df_all_group_sum.iterrows():
-                idx = int(idx)
-                year_month, month_year, fom = row[0:3]
-                month_spend_total, month_income_total, month_present_income_total, month_budget_total = row[-4:]
-
-                # calculate the remaining days of the current month
-                days_remaining = pd.Period(self.today,
-                                           freq='M').end_time.date().day - self.today.day if self.today.month == year_month.month else 0
-
-                fig.add_trace(go.Scatter(x=[month_year, month_year],
-                                         y=[month_spend_total, month_income_total],
-                                         mode='lines',
-                                         line=dict(color='black', width=2),
-                                         name="Surplus",
-                                         hoverinfo="skip",
-                                         hovertext=f"{round(month_income_total - month_spend_total, 2)}",
-                                         hovertemplate=f"${round(month_income_total - month_spend_total, 2)}<extra></extra>",
-                                         legendgroup="Surplus",
-                                         showlegend=False if idx > 0 else True))
-                fig.add_trace(go.Scatter(x=[month_year, month_year],
-                                         y=[month_spend_total, month_budget_total],
-                                         mode='lines',
-                                         line=dict(color='darkgray', width=2),
-                                         name="Left",
-                                         hoverinfo="skip",
-                                         hovertext=f"{round(month_budget_total - month_spend_total, 2)} ({days_remaining})",
-                                         hovertemplate=f"${round(month_budget_total - month_spend_total, 2)} ({days_remaining})<extra></extra>",
-                                         legendgroup="Left",
-                                         showlegend=False if idx > 0 else True))
-
-            # fig.add_hrect(y0=m_expenses, y1=m_income, line_width=0, fillcolor="red", opacity=0.1)
-
-            # make y-max 500 more than the highest income month
-            fig.update_layout(yaxis_range=(0, df_all_group_sum["Income_Total"].max() + 500), hovermode="x unified")
-
-            # create cumulative sum surplus figure over time
-            surplus_y = (df_all_group_sum["Income_Total"] - df_all_group_sum[
-                "Expense_Total"]).dropna().cumsum()
-            surplus_x = month_expense_sums["Month-Year"].unique()
-            surplus_fig = px.bar(x=surplus_x, y=surplus_y, labels={'x': 'Month-Year',
-                                                                   'y': "Surplus ($)"})
-            # add line with markers to tops of bars
-            surplus_fig.add_trace(
-                go.Scatter(x=surplus_x, y=surplus_y, mode='lines+markers', line=dict(color='green', width=2),
-                           showlegend=False))
-            surplus_fig.update_layout()
-
-        elif freq == 'Yearly':
-            # clip'd
-            df_all_group_sum = self.df_all_group_sum[self.df_all_group_sum["FOM"].between(start_date, end_date)]
-            year_expense_sums = self.df_expense_group_sum[self.df_expense_group_sum["FOM"].between(start_date, end_date)]
-
-            # group by year
-            df_all_group_sum = df_all_group_sum.groupby("Year", as_index=False, observed=False)[["Expense_Total",  "Income_Total",  "Budget_Total"]].sum()
-            year_expense_sums = year_expense_sums.groupby("Year", as_index=False, observed=False)["Expense_Total"].sum()
-
-            # group by type and aggregate for each year
-            year_group_sums = self.df_expense[self.df_expense["FOM"].between(start_date, end_date)].groupby(["Year", "Type"], observed=False)["Amount"].sum().round(2).reindex(
-                self.sorted_names, level='Type').reset_index()
-
-            # fix integer axis?
-            year_group_sums["Year"] = year_group_sums["Year"].astype(int).astype(str)
-            year_expense_sums["Year"] = year_expense_sums["Year"].astype(int).astype(str)
-            df_all_group_sum["Year"] = df_all_group_sum["Year"].astype(int).astype(str)
-
-            # create main time-series expense figure
-            fig = px.bar(year_group_sums, x='Year', y='Amount', color='Type', barmode='stack',
-                         color_discrete_map=self.color_dict,
-                         hover_data={'Type': False,
-                                     'Year': False},
-                         labels={'Amount': "Amount ($)"})
-
-            # format hover values to two decimal point floats
-            fig.update_traces(hovertemplate="%{y:$.2f}<extra></extra>")
-
-            # add time-series scatter traces for income and budget over time
-            # dashed lines with markers representing income and budget boundaries
-            fig.add_trace(go.Scatter(x=df_all_group_sum["Year"], y=df_all_group_sum["Income_Total"],
-                                     mode='lines+markers',
-                                     name='Income', line=dict(color='blue', width=4, dash='dash'),
-                                     hovertemplate="%{y:$.2f}<extra></extra>"))
-            fig.add_trace(go.Scatter(x=df_all_group_sum["Year"], y=df_all_group_sum["Budget_Total"],
-                                     mode='lines+markers',
-                                     name='Budget', line=dict(color='skyblue', width=4, dash='dash'),
-                                     hovertemplate="%{y:$.2f}<extra></extra>"))
-
-            fig.update_layout(yaxis_range=(0, df_all_group_sum["Income_Total"].max() + 500), hovermode="x unified")
-
-            # for now...
-            # create cumulative sum surplus figure over time
-            surplus_y = (df_all_group_sum["Income_Total"] - df_all_group_sum[
-                "Expense_Total"]).dropna().cumsum()
-            surplus_x = year_expense_sums["Year"].unique()
-            surplus_fig = px.bar(x=surplus_x, y=surplus_y, labels={'x': 'Year',
-                                                                   'y': "Surplus ($)"})
-            # add line with markers to tops of bars
-            surplus_fig.add_trace(
-                go.Scatter(x=surplus_x, y=surplus_y, mode='lines+markers', line=dict(color='green', width=2),
-                           showlegend=False))
-            surplus_fig.update_layout()
-
-        elif freq == 'Weekly':
-            surplus_fig = {}
-            raise NotImplementedError
-        else:
-            raise ValueError("Value must be one of {'Monthly', 'Yearly', 'Weekly'}")
-
-        return fig, surplus_fig
+        # Load data (shared, already parsed and typed frames from the ledger store)
+        self.df_income = store.read(income_fp)
+        self.df_budget = store.read(budget_fp)
+
+        # expense data, the spend cube is kept up to date by the store (for a streamed
+        # ledger the frame is only the latest rows, everything here comes from the cube)
+        self.df_expense = store.read(expense_fp)
+        self.expense_cube = store.ledger(expense_fp).cube
 
+        # set month_year list
+        self.month_year_list = list(self.expense_cube.months().strftime("%b-%Y"))
+
+    def data_version(self, *file_paths) -> tuple:
+        return (self.today.date(),) + tuple(self.versions[file_path] for file_path in file_paths)
+
+    def spending_series(self) -> dict:
+        """
+        Full history of what the range figures show, for drawing them in the
+        browser (range_figures.render_range): spend per day (from first_day on)
+        and Type, income and budget per day, amounts in cents and days as
+        days since 1970-01-01
+        """
+        if self._spending_series is None:
+            cents = lambda values: np.asarray(values, dtype=np.int64).tolist()
+            day_number = lambda timestamp: int((pd.Timestamp(timestamp).normalize() - pd.Timestamp(0)).days)
+            cube = self.expense_cube
+            day_totals = period_totals({"Income": self.df_income, "Budget": self.df_budget}, 'D')
+            self._spending_series = {
+                "first_day": day_number(cube.days[0]) if len(cube.days) else 0,
+                "expense": {str(name): cents(cube.daily[:, idx]) for idx, name in enumerate(cube.types)},
+                "days": day_totals.index.asi8.tolist(),
+                "income": cents(day_totals["Income"]),
+                "budget": cents(day_totals["Budget"]),
+                "today": day_number(self.today),
+                "types": list(self.sorted_names),
+                "colors": self.color_dict,
+                "hidden": list(self.legend_hidden),
+                "frequencies": {freq: [period, x_name] for freq, (period, x_name) in self.frequency_dict.items()},
+                "template": compact_template.to_plotly_json()}
+        return self._spending_series
+
+    @cached_figure(expense_fp)
+    def create_linked_figs(self, start_date, end_date):
+        """cat, name, dow, pie and ratios figures of one range, the cube is looked up once for all of them"""
+        type_sums, dow_sums, name_sums = self.expense_cube.range_sums(start_date, end_date)
+        return (self.cat_spend_fig(type_sums), self.name_spend_fig(name_sums, start_date, end_date),
+                self.dow_spend_fig(dow_sums),
+                self.pie_spend_fig(type_sums), self.ratios_fig(type_sums))
+
+    @cached_figure(expense_fp)
     def create_ratios_fig(self, start_date, end_date):
-        start_date = pd.Timestamp(start_date)
-        end_date = pd.Timestamp(end_date)
+        return self.ratios_fig(self.expense_cube.type_sums(start_date, end_date))
 
-        dff_month = self.df_expense[self.df_expense["Date"].between(start_date, end_date)]
-        month_group_sums = dff_month.groupby("Necesse", observed=False)["Amount"].sum().round(2).reset_index()
+    def ratios_fig(self, type_sums: pd.Series):
+        month_group_sums = to_dollars(SpendCube.by_necesse(type_sums, self.necesse_dict)).reset_index()
 
         fig = px.pie(month_group_sums, values='Amount', names='Necesse', color='Necesse', color_discrete_map=self.necesse_color_dict,
                      hole=0.5)
 
         return fig
 
+    @cached_figure(expense_fp)
     def create_cat_spend_fig(self, start_date, end_date):
-        start_date = pd.Timestamp(start_date)
-        end_date = pd.Timestamp(end_date)
-
-        dff_month = self.df_expense[self.df_expense["Date"].between(start_date, end_date)]
+        return self.cat_spend_fig(self.expense_cube.type_sums(start_date, end_date))
 
-        cat_group_sums = dff_month.groupby("Type", as_index=False, observed=False)["Amount"].sum()
+    def cat_spend_fig(self, type_sums: pd.Series):
+        cat_group_sums = to_dollars(type_sums).reset_index()
 
         # color_dict_so_far = {key: value for key, value in color_dict.items() if key in cat_group_sums["Type"].values}
 
         fig = px.bar(cat_group_sums, x="Type", y='Amount', color='Type', hover_data='Amount',
                      color_discrete_map=self.color_dict,
                      category_orders={"Type": self.sorted_names})
-        sel = ['Rent', "Savings", "Utilities"]
+        sel = self.legend_hidden
         fig.update_traces(selector=lambda t: t.name in sel, visible='legendonly')
 
         return fig
 
-    def create_name_spend_fig(self, start_date, end_date):
-        start_date = pd.Timestamp(start_date)
-        end_date = pd.Timestamp(end_date)
-
-        dff_month = self.df_expense[self.df_expense["Date"].between(start_date, end_date)]
-        dff_month["Type"] = dff_month["Type"].astype("object")
-
-        #dff_month = self.df_expense.loc[self.df_expense.loc[:, "Year-Month"] == month, :]
-        # dff_month.loc[:, "Type"] = dff_month.loc[:, "Type"].astype(
-        #     "object")  # weird error if one of the types has no entries as category
-        name_group_sums = dff_month.groupby(["Name", "Type"], as_index=False, observed=False)["Amount"].sum()
-        name_group_sums = name_group_sums[name_group_sums["Amount"] != 0.0].sort_values("Amount",
-                                                                                        ascending=False).reset_index(
-            drop=True)
-        # color_dict_so_far = {key: value for key, value in color_dict.items() if key in name_group_sums["Type"].values}
-
-        fig = px.bar(name_group_sums, x="Name", y="Amount", color='Type', hover_data='Amount',
+    @cached_figure(expense_fp)
+    def create_name_spend_fig(self, start_date, end_date, offset: int = 0):
+        return self.name_spend_fig(self.expense_cube.name_sums(start_date, end_date), start_date, end_date, offset)
+
+    def name_spend_fig(self, name_group_sums: pd.DataFrame, start_date, end_date, offset: int = 0):
+        """
+        Spend of the names ranked offset to offset + name_top_n by total, the
+        names after them summed up in one "Other names" bar (clicking it shows
+        the next ones, see drill_name_figure)
+        """
+        name_group_sums = name_group_sums[name_group_sums["Amount"] != 0]
+        name_codes, names = pd.factorize(name_group_sums["Name"])
+        name_totals = np.bincount(name_codes, weights=name_group_sums["Amount"].to_numpy(), minlength=len(names))
+
+        # only the names up to the last one shown are partitioned off and sorted, not all of them
+        last = min(offset + self.name_top_n, len(names))
+        top = np.argpartition(-name_totals, last - 1)[:last] if 0 < last < len(names) else np.arange(len(names))
+        top = top[np.argsort(-name_totals[top], kind='stable')]
+        ranked = top[offset:]
+
+        # rank of every row's name, -1 for the names after the shown ones
+        rank = np.full(len(names), -1)
+        rank[top] = np.arange(len(top))
+        row_rank = rank[name_codes]
+        shown = name_group_sums[row_rank >= offset].assign(rank=row_rank[row_rank >= offset]) \
+            .sort_values(["rank", "Amount"], ascending=(True, False)).drop(columns="rank")
+        other = name_group_sums[row_rank < 0].groupby("Type", as_index=False, observed=True)["Amount"].sum() \
+            .assign(Name=self.other_names)
+        name_order = list(names[ranked]) + ([self.other_names] if len(other) else [])
+
+        shown = pd.concat((shown, other), ignore_index=True) if len(other) else shown
+        fig = px.bar(shown.assign(Amount=to_dollars(shown["Amount"])),
+                     x="Name", y="Amount", color='Type', hover_data='Amount',
                      color_discrete_map=self.color_dict,
-                     category_orders={"Name": tuple(name_group_sums["Name"].values)})
-        sel = ['Rent', "Savings", "Utilities"]
+                     category_orders={"Name": name_order})
+        sel = self.legend_hidden
         fig.update_traces(selector=lambda t: t.name in sel, visible='legendonly')
 
+        other_count = len(names) - offset - len(ranked)
+        fig.update_layout(title=f"Names {offset + 1 if len(ranked) else 0}-{offset + len(ranked)} of {len(names)}"
+                                + (f", click {self.other_names} for the next {min(other_count, self.name_top_n)}"
+                                   if other_count > 0 else ""),
+                          # what the drill-down callback needs to build the next figure
+                          meta={"start_date": str(start_date), "end_date": str(end_date), "offset": offset})
         return fig
 
+    @cached_figure(expense_fp)
     def create_dow_spend_fig(self, start_date: datetime.date, end_date: datetime.date):
-        # if month is None:
-        #     month = self.today.strftime("%Y-%m")
-        #dff_month = self.df_expense[self.df_expense["Year-Month"] == month]
-        start_date = pd.Timestamp(start_date)
-        end_date = pd.Timestamp(end_date)
+        return self.dow_spend_fig(self.expense_cube.dow_sums(start_date, end_date))
 
-        dff_month = self.df_expense[self.df_expense["Date"].between(start_date, end_date)]
-        dff_month["DOW"] = dff_month["Date"].dt.strftime("%A")
-        day_group_sums = dff_month.groupby(["DOW", "Type"], observed=False)["Amount"].sum().round(2).reindex(
-                self.sorted_names, level='Type').reset_index()
+    def dow_spend_fig(self, dow_sums: pd.DataFrame):
+        day_group_sums = to_dollars(dow_sums) \
+            .reindex(columns=self.sorted_names).stack(dropna=False).rename("Amount").reset_index()
 
         fig = px.bar(day_group_sums, x='DOW', y='Amount', color='Type', barmode='stack',
                      color_discrete_map=self.color_dict,
@@ -364,7 +233,7 @@ class MoneyDash:
                                  'DOW': False},
                      labels={'Amount': "Amount ($)"})
 
-        sel = ['Rent', "Savings", "Utilities"]
+        sel = self.legend_hidden
         fig.update_traces(selector=lambda t: t.name in sel, visible='legendonly')
 
         fig.update_layout(hovermode="x unified")
@@ -373,45 +242,45 @@ class MoneyDash:
 
         return fig
 
+    @cached_figure(expense_fp)
     def create_pie_spend_fig(self, start_date: datetime.date, end_date: datetime.date):
-        # if month is None:
-        #     month = self.today.strftime("%Y-%m")
-        # dff_month = self.df_expense[self.df_expense["Year-Month"] == month]
-        start_date = pd.Timestamp(start_date)
-        end_date = pd.Timestamp(end_date)
-
-        dff_month = self.df_expense[self.df_expense["Date"].between(start_date, end_date)]
-        month_expense_sums = dff_month.groupby(["Year-Month"], as_index=False, observed=False)["Amount"].sum().round(2)
-        month_group_sums = dff_month.groupby(["Year-Month", "Type"], observed=False)["Amount"].sum().round(2).reindex(self.sorted_names,
-                                                                                                      level='Type').reset_index()
-        month_group_sums["Month-Year"] = month_group_sums["Year-Month"].dt.strftime("%b-%Y")
-        month_expense_sums["Month-Year"] = month_expense_sums["Year-Month"].dt.strftime("%b-%Y")
+        return self.pie_spend_fig(self.expense_cube.type_sums(start_date, end_date))
+
+    def pie_spend_fig(self, type_sums: pd.Series):
+        month_group_sums = to_dollars(type_sums) \
+            .reindex(self.sorted_names).reset_index()
         fig = px.pie(month_group_sums, values='Amount', names='Type', color='Type', color_discrete_map=self.color_dict, hole=0.5)
 
         return fig
 
+    @cached_figure(expense_fp, income_fp)
     def create_total_spend_fig(self):
-        dff_income = self.df_income[self.df_income["Date"] <= self.today]
-        dff_expense = self.df_expense[self.df_expense["Date"] <= self.today]
+        dff_income = date_slice(self.df_income, end_date=self.today)
+        type_sums = self.expense_cube.type_sums(end_date=self.today)
 
         # will be "off" for a month if all paydays haven't passed
-        income_sum = dff_income["Amount"].sum().round(2)
-        expense_sum_all = dff_expense["Amount"].sum().round(2)
-        expense_sum = dff_expense[dff_expense["Type"] != "Savings"]["Amount"].sum().round(2)
-        saving_sum = dff_expense[dff_expense["Type"] == "Savings"]["Amount"].sum().round(2)
+        income_sum = cents_array(dff_income["Amount"]).sum()
+        expense_sum_all = type_sums.sum()
+        expense_sum = type_sums.drop("Savings", errors="ignore").sum()
+        saving_sum = type_sums.get("Savings", 0)
 
-        fig = px.bar(x=(saving_sum + (income_sum - expense_sum_all), expense_sum, income_sum),
+        fig = px.bar(x=to_dollars(np.array((saving_sum + (income_sum - expense_sum_all), expense_sum, income_sum))),
                      y=('Savings', 'Expenses', 'Income'),
                      labels={'x': 'Amount', 'y': 'Type'},
                      orientation='h')
         return fig
 
 
+def get_money_dash() -> MoneyDash:
+    # only rebuilt when one of the .csv files changed (or the day did, for the "present" income)
+    return store.view("money_dash", MoneyDash, expense_fp, income_fp, budget_fp,
+                      token=datetime.date.today)
+
+
 # kind of like a dash page reload callback when used with multipage app
 # if you just create a "layout" variable, it doesn't reload
 def layout():
-    global money_dash
-    money_dash = MoneyDash()
+    money_dash = get_money_dash()
 
     # month list and dict
     # year list
@@ -422,14 +291,10 @@ def layout():
     # minimum years
     minimum_year, maximum_year = str(min(money_dash.year_list)), str(max(money_dash.year_list))
 
-    # start and end moy
-    start_date = datetime.datetime.strptime(f"January-{minimum_year}", "%B-%Y").date()
-    end_date = datetime.datetime.strptime(f"December-{maximum_year}", "%B-%Y").date()
-
     # minimum and maximum dates for DatePickerRange
     minimum_date = money_dash.df_budget["Date"].min().date()
 
-    expense_max_date = money_dash.df_expense["Date"].max().date()
+    expense_max_date = money_dash.expense_cube.days[-1].date()
     maximum_date = date(expense_max_date.year,
                         expense_max_date.month,
                         calendar.monthrange(expense_max_date.year, expense_max_date.month)[-1])
@@ -439,7 +304,6 @@ def layout():
     today_min = date(tonight_tonight.year, tonight_tonight.month, 1)
     today_max = date(tonight_tonight.year, tonight_tonight.month, today_max)
 
-    range_spend_fig, range_surplus_fig = money_dash.create_range_spend_figs(start_date, end_date)
     range_ratios_fig = money_dash.create_ratios_fig(minimum_date, maximum_date)
     cat_spend_fig = money_dash.create_cat_spend_fig(minimum_date, maximum_date)
     name_spend_fig = money_dash.create_name_spend_fig(minimum_date, maximum_date)
@@ -457,19 +321,39 @@ def layout():
                 dcc.Dropdown(options=year_list, value=maximum_year, clearable=False, id='spending-year-max-drop', style={'width': "80%"}),
                 dcc.Dropdown(options=month_list, value='January', clearable=False, id='spending-month-min-drop', style={'width': "100%"}),
                 dcc.Dropdown(options=month_list, value='December', clearable=False, id='spending-month-max-drop', style={'width': "100%"}),
-                dcc.Dropdown(options=['Yearly', 'Monthly', 'Weekly'], value="Monthly", clearable=False, id='spending-frequency-drop', style={'width': "100%"}),
+                dcc.Dropdown(options=list(money_dash.frequency_dict), value="Monthly", clearable=False, id='spending-frequency-drop', style={'width': "100%"}),
                 dcc.Dropdown(options=month_year_list, value=None, clearable=True, id='spending-month-iso-drop', style={'width': "100%", "padding-left": "20px"}),
             ], style={'display': 'flex', 'width': '66%'}),
 
             dcc.Graph(
-                id='spending-range',
-                figure=range_spend_fig
+                id='spending-range'
             ),
             html.H2("""Surplus Over Time"""),
             dcc.Graph(
-                id='surplus-range',
-                figure=range_surplus_fig
-            )
+                id='surplus-range'
+            ),
+            # drawn in the browser from the full history, see range_figures
+            dcc.Store(id='spending-series', data=money_dash.spending_series())
+        ]),
+        html.Div(children=[
+            html.H2("""Linked Range"""),
+            html.Div(children=[
+                daq.BooleanSwitch(id='linked-range-switch',
+                                  on=True,
+                                  label="Same range for the figures below (their own pickers still change just them)",
+                                  labelPosition="right",
+                                  style={'padding': 0,
+                                         'margin': 0,
+                                         'display': 'block'}),
+                dcc.DatePickerRange(
+                id='linked-date-picker-range',
+                start_date=today_min,
+                min_date_allowed=minimum_date,
+                max_date_allowed=maximum_date,
+                end_date=today_max
+            ),
+            dcc.Dropdown(options=month_year_list, value=None, clearable=True, id='linked-month-iso-drop', style={'width': "33%"}),
+                ], style={'display': 'block', 'width': '100%'}),
         ]),
         html.Div(children=[
             html.H2("""Ratios (Needs : Savings : Wants)"""),
@@ -522,7 +406,8 @@ def layout():
                 end_date=today_max
             ),
                 dcc.Dropdown(options=month_year_list, value=None, clearable=True, id='name-month-iso-drop',
-                             style={'width': "33%"})
+                             style={'width': "33%"}),
+                html.Button('Top Names', id='name-top-button', n_clicks=0)
             ], style={'display': 'block', 'width': '100%'}),
             dcc.Graph(
                 id='spending-name',
@@ -571,13 +456,14 @@ def layout():
     return hlayout
 
 
+# after the background worker rebuilt the aggregates, build the page's figures too
+# so the first visit after a data change finds them in the figure cache
+store.on_refresh("money_dash", layout)
+
+
 # callbacks
-@callback(
-      Output('spending-category', 'figure'),
-      Input('cat-date-picker-range', 'start_date'),
-      Input('cat-date-picker-range', 'end_date'),
-      Input('cat-month-iso-drop', 'value'))
-def update_cat_figure(start_date, end_date, month_iso):
+def picked_range(start_date: str, end_date: str, month_iso) -> tuple:
+    """(start, end) dates of a date picker, or of the whole month picked in its month dropdown"""
     start_date = datetime.datetime.strptime(start_date, "%Y-%m-%d").date()
     end_date = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
     if month_iso is not None and isinstance(month_iso, str):
@@ -586,79 +472,102 @@ def update_cat_figure(start_date, end_date, month_iso):
         _, last = calendar.monthrange(iso_year, iso_month)
         start_date = datetime.datetime(iso_year, iso_month, 1).date()
         end_date = datetime.datetime(iso_year, iso_month, last).date()
-    return money_dash.create_cat_spend_fig(start_date, end_date)
+    return start_date, end_date
+
+
+# one range for all five figures (and on page load), each figure's own picker overrides it for that figure
+@callback(
+      Output('spending-category', 'figure', allow_duplicate=True),
+      Output('spending-name', 'figure', allow_duplicate=True),
+      Output('spending-dow', 'figure', allow_duplicate=True),
+      Output('spending-pie', 'figure', allow_duplicate=True),
+      Output('spending-ratios', 'figure', allow_duplicate=True),
+      Input('linked-date-picker-range', 'start_date'),
+      Input('linked-date-picker-range', 'end_date'),
+      Input('linked-month-iso-drop', 'value'),
+      Input('linked-range-switch', 'on'),
+      prevent_initial_call='initial_duplicate')
+def update_linked_figures(start_date, end_date, month_iso, linked):
+    if not linked:
+        return (no_update,) * 5
+    return get_money_dash().create_linked_figs(*picked_range(start_date, end_date, month_iso))
+
+
+@callback(
+      Output('spending-category', 'figure'),
+      Input('cat-date-picker-range', 'start_date'),
+      Input('cat-date-picker-range', 'end_date'),
+      Input('cat-month-iso-drop', 'value'),
+      prevent_initial_call=True)
+def update_cat_figure(start_date, end_date, month_iso):
+    return get_money_dash().create_cat_spend_fig(*picked_range(start_date, end_date, month_iso))
 
 
 @callback(
       Output('spending-name', 'figure'),
       Input('name-date-picker-range', 'start_date'),
       Input('name-date-picker-range', 'end_date'),
-      Input('name-month-iso-drop', 'value'))
+      Input('name-month-iso-drop', 'value'),
+      prevent_initial_call=True)
 def update_name_figure(start_date, end_date, month_iso):
-    start_date = datetime.datetime.strptime(start_date, "%Y-%m-%d").date()
-    end_date = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
-    if month_iso is not None and isinstance(month_iso, str):
-        iso_date = datetime.datetime.strptime(month_iso, "%b-%Y").date()
-        iso_month, iso_year = iso_date.month, iso_date.year
-        _, last = calendar.monthrange(iso_year, iso_month)
-        start_date = datetime.datetime(iso_year, iso_month, 1).date()
-        end_date = datetime.datetime(iso_year, iso_month, last).date()
-    return money_dash.create_name_spend_fig(start_date, end_date)
+    return get_money_dash().create_name_spend_fig(*picked_range(start_date, end_date, month_iso))
 
 
 @callback(
       Output('spending-dow', 'figure'),
       Input('dow-date-picker-range', 'start_date'),
       Input('dow-date-picker-range', 'end_date'),
-      Input('dow-month-iso-drop', 'value'))
+      Input('dow-month-iso-drop', 'value'),
+      prevent_initial_call=True)
 def update_dow_figure(start_date, end_date, month_iso):
-    start_date = datetime.datetime.strptime(start_date, "%Y-%m-%d").date()
-    end_date = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
-    if month_iso is not None and isinstance(month_iso, str):
-        iso_date = datetime.datetime.strptime(month_iso, "%b-%Y").date()
-        iso_month, iso_year = iso_date.month, iso_date.year
-        _, last = calendar.monthrange(iso_year, iso_month)
-        start_date = datetime.datetime(iso_year, iso_month, 1).date()
-        end_date = datetime.datetime(iso_year, iso_month, last).date()
-    return money_dash.create_dow_spend_fig(start_date, end_date)
+    return get_money_dash().create_dow_spend_fig(*picked_range(start_date, end_date, month_iso))
 
 
 @callback(
       Output('spending-pie', 'figure'),
       Input('pie-date-picker-range', 'start_date'),
       Input('pie-date-picker-range', 'end_date'),
-      Input('pie-month-iso-drop', 'value'))
+      Input('pie-month-iso-drop', 'value'),
+      prevent_initial_call=True)
 def update_pie_figure(start_date, end_date, month_iso):
-    start_date = datetime.datetime.strptime(start_date, "%Y-%m-%d").date()
-    end_date = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
-    if month_iso is not None and isinstance(month_iso, str):
-        iso_date = datetime.datetime.strptime(month_iso, "%b-%Y").date()
-        iso_month, iso_year = iso_date.month, iso_date.year
-        _, last = calendar.monthrange(iso_year, iso_month)
-        start_date = datetime.datetime(iso_year, iso_month, 1).date()
-        end_date = datetime.datetime(iso_year, iso_month, last).date()
-    return money_dash.create_pie_spend_fig(start_date, end_date)
+    return get_money_dash().create_pie_spend_fig(*picked_range(start_date, end_date, month_iso))
 
 
 @callback(
       Output('spending-ratios', 'figure'),
       Input('ratios-date-picker-range', 'start_date'),
       Input('ratios-date-picker-range', 'end_date'),
-      Input('ratios-month-iso-drop', 'value'))
+      Input('ratios-month-iso-drop', 'value'),
+      prevent_initial_call=True)
 def update_ratios_figure(start_date, end_date, month_iso):
-    start_date = datetime.datetime.strptime(start_date, "%Y-%m-%d").date()
-    end_date = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
-    if month_iso is not None and isinstance(month_iso, str):
-        iso_date = datetime.datetime.strptime(month_iso, "%b-%Y").date()
-        iso_month, iso_year = iso_date.month, iso_date.year
-        _, last = calendar.monthrange(iso_year, iso_month)
-        start_date = datetime.datetime(iso_year, iso_month, 1).date()
-        end_date = datetime.datetime(iso_year, iso_month, last).date()
-    return money_dash.create_ratios_fig(start_date, end_date)
+    return get_money_dash().create_ratios_fig(*picked_range(start_date, end_date, month_iso))
 
 
-# multi-output callbacks?
+# clicking "Other names" shows the names after the shown ones, the button goes back to the top ones
 @callback(
+      Output('spending-name', 'figure', allow_duplicate=True),
+      Input('spending-name', 'clickData'),
+      Input('name-top-button', 'n_clicks'),
+      State('spending-name', 'figure'),
+      prevent_initial_call=True)
+def drill_name_figure(click_data, n_clicks, figure):
+    money_dash = get_money_dash()
+    meta = figure["layout"].get("meta") if figure else None
+    if not meta:
+        return no_update
+    if ctx.triggered_id == 'name-top-button':
+        offset = 0
+    elif click_data and click_data["points"][0].get("x") == money_dash.other_names:
+        offset = meta["offset"] + money_dash.name_top_n
+    else:
+        return no_update
+    return money_dash.create_name_spend_fig(datetime.date.fromisoformat(meta["start_date"]),
+                                            datetime.date.fromisoformat(meta["end_date"]), offset)
+
+
+# range figures are redrawn in the browser, changing the months or the frequency doesn't reach the server
+clientside_callback(
+    render_range,
     Output('spending-range', 'figure'),
     Output('surplus-range', 'figure'),
     Input('spending-year-min-drop', 'value'),
@@ -666,11 +575,5 @@ def update_ratios_figure(start_date, end_date, month_iso):
     Input('spending-month-min-drop', 'value'),
     Input('spending-month-max-drop', 'value'),
     Input('spending-frequency-drop', 'value'),
-    Input('spending-month-iso-drop', 'value'))
-def update_spending_figure(start_year, end_year, start_month, end_month, frequency, month_iso):
-    start_date = datetime.datetime.strptime(f"{start_month}-{start_year}", "%B-%Y").date()
-    end_date = datetime.datetime.strptime(f"{end_month}-{end_year}", "%B-%Y").date()
-    if frequency == "Monthly" and (month_iso is not None and isinstance(month_iso, str)):
-        iso_date = datetime.datetime.strptime(month_iso, "%b-%Y").date()
-        start_date, end_date = (iso_date, iso_date)
-    return money_dash.create_range_spend_figs(start_date, end_date, frequency)
+    Input('spending-month-iso-drop', 'value'),
+    Input('spending-series', 'data'))
@@ -1,35 +1,25 @@
-from pathlib import Path
 import dash
 
-from dash import dash_table, html, Input, Output, State, callback
+from dash import dash_table, dcc, html, Input, Output, State, Patch, callback, clientside_callback, no_update
 import dash_daq as daq
 import datetime
 
-import pandas as pd
-import os
+import ledger_backup
+from editor_changes import no_changes, track_changes
+from ledger_pages import ledger_page
+from ledger_store import store, ledger_columns, InvalidRows, RowsChanged, expense_fp as file_path
 
 # register page in app
 dash.register_page(__name__,
                    title='Expense Data Editor',
                    name='Expense Data Editor')
 
-# Load data
-data_fp = Path(__file__).parents[2] / "data"
-file_path = data_fp / "Expenses - Expense_Data.csv"
-
 
 def layout():
-    df_expense = pd.read_csv(file_path, dtype={"Name": "object",
-                                               "Amount": "float",
-                                               "Type": "category",
-                                               "Date": "object"})
-
-    # convert revert
-    df_expense["Date"] = pd.to_datetime(df_expense["Date"])
-    df_expense = df_expense.sort_values("Date")
-    df_expense["Date"] = df_expense["Date"].dt.strftime("%m/%d/%Y")
+    # only the types, the rows are served a page at a time by update_page
+    types = store.read(file_path)["Type"].cat.categories
 
-    cols = df_expense.columns
+    cols = ledger_columns
 
     page_layout = html.Div([
         dash_table.DataTable(
@@ -51,21 +41,30 @@ def layout():
                 'fontWeight': 'bold'
                 },
             columns=([{'id': c, 'name': c} if c != "Type" else {'id': c, 'name': c, 'presentation': 'dropdown'} for c in cols]),
-            data=df_expense.to_dict('records'),
             dropdown={
                 'Type': {
                     'clearable': False,
                     'options': [
                         {'label': i, 'value': i}
-                        for i in df_expense['Type'].unique()
+                        for i in types
                     ]
                 }},
             editable=True,
             fill_width=False,
             row_deletable=True,
-            page_size=500
+            page_current=0,
+            page_size=500,
+            page_action='custom',
+            sort_action='custom',
+            sort_mode='single',
+            sort_by=[],
+            filter_action='custom',
+            filter_query=''
         ),
         html.Div(id='occultum-sum-e', hidden=True),
+        html.Div(id='save-message-e'),
+        dcc.Store(id='pending-changes-e', data=no_changes),
+        dcc.Store(id='saved-changes-e'),
         html.Div([
             html.Button('Add Row', id='editing-rows-button-e', n_clicks=0),
             html.Button('Save Changes', id='save-button-e', n_clicks=0),
@@ -83,39 +82,72 @@ def layout():
 
 @callback(
     Output('adding-rows-table-e', 'data'),
+    Output('adding-rows-table-e', 'page_count'),
+    Input('adding-rows-table-e', 'page_current'),
+    Input('adding-rows-table-e', 'page_size'),
+    Input('adding-rows-table-e', 'sort_by'),
+    Input('adding-rows-table-e', 'filter_query'),
+    Input('saved-changes-e', 'data'),
+    State('pending-changes-e', 'data'))
+def update_page(page_current, page_size, sort_by, filter_query, saved, changes):
+    # rows keep their id (the row in the file) so edits can be saved as changes,
+    # after a save the page is served again with the rows renumbered
+    return ledger_page(file_path, page_current, page_size, sort_by, filter_query, changes)
+
+
+@callback(
+    Output('adding-rows-table-e', 'data', allow_duplicate=True),
+    Output('pending-changes-e', 'data'),
     Input('editing-rows-button-e', 'n_clicks'),
-    State('adding-rows-table-e', 'data'),
-    State('adding-rows-table-e', 'columns'))
-def add_row(n_clicks, rows, columns):
+    State('adding-rows-table-e', 'columns'),
+    prevent_initial_call=True)
+def add_row(n_clicks, columns):
+    # only the new row goes back to the table, added rows get negative ids until saved
+    rows, changes = Patch(), Patch()
     if n_clicks > 0:
-        new_row = {}
-        for c in columns:
-            new_row_value = '' if c['id'] != 'Date' else datetime.datetime.today().strftime("%m/%d/%Y")
-            new_row[c['id']] = new_row_value
+        new_row = {c['id']: '' if c['id'] != 'Date' else datetime.datetime.today().strftime("%m/%d/%Y") for c in columns}
+        new_row['id'] = -n_clicks
         rows.append(new_row)
-    return rows
+        changes['rows'][str(-n_clicks)] = new_row
+    return rows, changes
+
+
+clientside_callback(
+    track_changes,
+    Output('pending-changes-e', 'data', allow_duplicate=True),
+    Input('adding-rows-table-e', 'data_timestamp'),
+    State('adding-rows-table-e', 'data'),
+    State('adding-rows-table-e', 'data_previous'),
+    State('pending-changes-e', 'data'),
+    prevent_initial_call=True)
 
 
 @callback(
     Output('occultum-sum-e', 'children'),
+    Output('pending-changes-e', 'data', allow_duplicate=True),
+    Output('saved-changes-e', 'data'),
+    Output('save-message-e', 'children'),
     Input('save-button-e', 'n_clicks'),
     Input('backup-switch-e', 'on'),
-    State('adding-rows-table-e', 'data'))
-def save_changes(n_clicks: int, on: bool, rows: dict) -> None:
-    if n_clicks > 0:
-        # get dataframe back from dash table
-        # write saved changes to file
-        df = pd.DataFrame(rows)
-        # convert revert
-        df["Date"] = pd.to_datetime(df["Date"])
-        df = df.sort_values("Date")
-        df["Date"] = df["Date"].dt.strftime("%m/%d/%Y")
-        df.to_csv(file_path, index=False)
-
-        # backup expense .csv
+    State('pending-changes-e', 'data'),
+    prevent_initial_call=True)
+def save_changes(n_clicks: int, on: bool, changes: dict) -> tuple:
+    if n_clicks > 0 and (changes['rows'] or changes['deleted']):
+        # write only the changed rows to file
+        try:
+            saved = store.apply_changes(file_path, changes['rows'], changes['deleted'], changes.get('original', {}))
+        except RowsChanged as e:
+            # saved elsewhere in the meantime, the page is served again as the file is now
+            return None, no_changes, {"stale": e.row_ids}, \
+                f"Not saved: rows {', '.join(str(row_id) for row_id in e.row_ids)} changed since they were loaded " \
+                f"(saved from another tab?), the page was reloaded."
+        except InvalidRows as e:
+            # nothing written, the changes stay to be fixed
+            return no_update, no_update, no_update, "Not saved: " + "; ".join(
+                f"{'row ' + str(row_id) if row_id >= 0 else 'new row'}: {reason}" for row_id, reason in e.reasons.items())
+
+        # backup expense .csv (only the chunks that changed are stored)
         if on:
-            backup_file_name = f"{file_name}_{datetime.datetime.today().strftime('%Y%m%d%H%M%S')}.csv"
-            backup_file_dir = os.path.join(file_dir, "backup")
-            if not os.path.isdir(backup_file_dir):
-                os.mkdir(backup_file_dir)
-            df.to_csv(os.path.join(backup_file_dir, backup_file_name), index=False)
+            ledger_backup.backup(file_path)
+        return None, no_changes, saved, ""
+    return no_update, no_update, no_update, no_update
@@ -1,4 +1,3 @@
-from pathlib import Path
 import datetime
 
 # dash and plotly
@@ -8,7 +7,7 @@ import plotly.express as px
 
 # data
 import pandas as pd
-pd.options.mode.chained_assignment = None
+from ledger_store import store, worth_fp
 
 # register page in app
 dash.register_page(__name__,
@@ -35,9 +34,7 @@ class WorthDash:
         self.load_data()
 
     def load_data(self):
-        data_fp = Path(__file__).parents[2] / "data"
-        file_path = data_fp / "Quarterly_Worth.csv"
-        self.df_worth = pd.read_csv(file_path)
+        self.df_worth = store.read(worth_fp).copy()
 
         self.df_worth["Date"] = pd.to_datetime(self.df_worth["Date"])
         self.df_worth["Year-Month"] = pd.to_datetime(self.df_worth["Date"]).dt.to_period('M')
@@ -72,8 +69,7 @@ class WorthDash:
 # kind of like a dash page reload callback when used with multipage app
 # if you just create a "layout" variable, it doesn't reload
 def layout():
-    global worth_dash
-    worth_dash = WorthDash()
+    worth_dash = store.view("worth_dash", WorthDash, worth_fp)
 
     bar_worth_fig = worth_dash.create_bar_worth_fig()
 
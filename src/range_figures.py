@@ -0,0 +1,152 @@
+"""
+The spending / surplus range figures of the budget page, drawn in the
+browser. The page ships the full history once (MoneyDash.spending_series:
+spend per day and Type, income and budget per day, all in cents) in a
+dcc.Store, and changing the months, the frequency or picking a single month
+only re-aggregates that in the browser, no round trip to the server.
+"""
+
+# (year min, year max, month min, month max, frequency, single month, series) -> (spending figure, surplus figure)
+render_range = """
+function(startYear, endYear, startMonth, endMonth, frequency, monthIso, series) {
+    if (!series || !(frequency in series.frequencies)) {
+        return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+    }
+    const DAY = 86400000;
+    const months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"];
+    const longMonths = ["January", "February", "March", "April", "May", "June",
+                        "July", "August", "September", "October", "November", "December"];
+    // days are counted from 1970-01-01, like the series
+    const dayOf = (year, month, date) => Math.round(Date.UTC(year, month, date) / DAY);
+    const dateOf = day => new Date(day * DAY);
+    const dayLabel = day => {
+        const date = dateOf(day);
+        return `${String(date.getUTCDate()).padStart(2, "0")}-${months[date.getUTCMonth()]}-${date.getUTCFullYear()}`;
+    };
+
+    let start = dayOf(+startYear, longMonths.indexOf(startMonth), 1);
+    let end = dayOf(+endYear, longMonths.indexOf(endMonth) + 1, 0);
+    // a single month, at whatever frequency
+    if (monthIso) {
+        const [month, year] = monthIso.split("-");
+        start = dayOf(+year, months.indexOf(month), 1);
+        end = dayOf(+year, months.indexOf(month) + 1, 0);
+    }
+
+    // period of a day as [key (ordered like the periods), label, last day of the period]
+    const [freq, xName] = series.frequencies[frequency];
+    const period = {
+        Y: day => {
+            const year = dateOf(day).getUTCFullYear();
+            return [year, String(year), dayOf(year + 1, 0, 0)];
+        },
+        Q: day => {
+            const date = dateOf(day), year = date.getUTCFullYear(), quarter = Math.floor(date.getUTCMonth() / 3);
+            return [year * 4 + quarter, `${year} Q${quarter + 1}`, dayOf(year, quarter * 3 + 3, 0)];
+        },
+        M: day => {
+            const date = dateOf(day), year = date.getUTCFullYear(), month = date.getUTCMonth();
+            return [year * 12 + month, `${months[month]}-${year}`, dayOf(year, month + 1, 0)];
+        },
+        // weeks end on sunday (pandas' 'W') and are labelled by their monday
+        W: day => {
+            const monday = day - ((day + 3) % 7 + 7) % 7;
+            return [monday, dayLabel(monday), monday + 6];
+        },
+        D: day => [day, dayLabel(day), day],
+    }[freq];
+
+    // every period with a row of any ledger in the range, the cut ones only count the days inside it
+    const periods = new Map();
+    const periodRow = day => {
+        const [key, label, last] = period(day);
+        let row = periods.get(key);
+        if (row === undefined) {
+            row = {key, label, last, types: {}, expense: 0, income: 0, incomeNow: 0, budget: 0};
+            periods.set(key, row);
+        }
+        return row;
+    };
+    const types = Object.keys(series.expense);
+    const length = types.length ? series.expense[types[0]].length : 0;
+    for (let day = Math.max(start, series.first_day); day <= Math.min(end, series.first_day + length - 1); day++) {
+        const row = periodRow(day), i = day - series.first_day;
+        for (const type of types) {
+            const cents = series.expense[type][i];
+            row.types[type] = (row.types[type] || 0) + cents;
+            row.expense += cents;
+        }
+    }
+    series.days.forEach((day, i) => {
+        if (day < start || day > end) {
+            return;
+        }
+        const row = periodRow(day);
+        row.income += series.income[i];
+        row.budget += series.budget[i];
+        if (day <= series.today) {
+            row.incomeNow += series.income[i];
+        }
+    });
+    const rows = Array.from(periods.values()).sort((a, b) => a.key - b.key);
+
+    const x = rows.map(row => row.label);
+    const dollars = value => rows.map(row => value(row) / 100);
+    const spend = dollars(row => row.expense), income = dollars(row => row.income), budget = dollars(row => row.budget);
+    const hidden = new Set(series.hidden);
+
+    // stacked spend per type, hidden ones only in the legend (clicks on the legend stay over re-renders)
+    const data = series.types.map(type => ({
+        type: "bar", name: type, legendgroup: type, x, y: dollars(row => row.types[type] || 0),
+        marker: {color: series.colors[type]}, visible: hidden.has(type) ? "legendonly" : true,
+        hovertemplate: "%{y:$.2f}<extra></extra>",
+    }));
+    const line = (name, color, y) => ({
+        type: "scatter", name, x, y, mode: "lines+markers", line: {color, width: 4, dash: "dash"},
+        hovertemplate: "%{y:$.2f}<extra></extra>",
+    });
+    data.push(line("Present Income", "blueviolet", dollars(row => row.incomeNow)),
+              line("Total Income", "blue", income),
+              line("Budget", "skyblue", budget));
+
+    // surplus (income - spend) and what's left of the budget, vertical segments split by nulls
+    const currentKey = period(series.today)[0];
+    const segments = (y0, y1, customdata) => {
+        const trace = {x: [], y: [], customdata: []};
+        rows.forEach((row, i) => {
+            trace.x.push(x[i], x[i], null);
+            trace.y.push(y0[i], y1[i], null);
+            trace.customdata.push(customdata[i], customdata[i], null);
+        });
+        return trace;
+    };
+    data.push(Object.assign(segments(spend, income, rows.map(row => (row.income - row.expense) / 100)), {
+        type: "scatter", mode: "lines", name: "Surplus", line: {color: "black", width: 2},
+        hovertemplate: "$%{customdata:.2f}<extra></extra>",
+    }));
+    data.push(Object.assign(segments(spend, budget, rows.map(row => [(row.budget - row.expense) / 100,
+                                                                     row.key === currentKey ? row.last - series.today : 0])), {
+        type: "scatter", mode: "lines", name: "Left", line: {color: "darkgray", width: 2},
+        hovertemplate: "$%{customdata[0]:.2f} (%{customdata[1]})<extra></extra>",
+    }));
+
+    const spendingFigure = {data, layout: {
+        template: series.template, barmode: "stack", hovermode: "x unified", margin: {t: 60},
+        legend: {title: {text: "Type"}, tracegroupgap: 0, uirevision: "types"},
+        xaxis: {title: {text: xName}},
+        // 500 more than the highest income period
+        yaxis: {title: {text: "Amount ($)"}, range: [0, (rows.length ? Math.max(...income) : 0) + 500]},
+    }};
+
+    let running = 0;
+    const cumulative = rows.map(row => (running += row.income - row.expense) / 100);
+    const surplusFigure = {data: [
+        {type: "bar", x, y: cumulative, hovertemplate: `${xName}=%{x}<br>Surplus ($)=%{y}<extra></extra>`},
+        {type: "scatter", x, y: cumulative, mode: "lines+markers", line: {color: "green", width: 2}, showlegend: false},
+    ], layout: {
+        template: series.template, barmode: "relative", margin: {t: 60},
+        xaxis: {title: {text: xName}}, yaxis: {title: {text: "Surplus ($)"}},
+    }};
+    return [spendingFigure, surplusFigure];
+}
+"""
@@ -0,0 +1,63 @@
+"""
+import_statement.RuleIndex: Type of a statement name from the exact name,
+else a learned prefix, else the keyword rules, else the default. And the
+transaction ids of read_ofx.
+
+python -m pytest tests
+"""
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+import pandas as pd
+
+from import_statement import RuleIndex, read_ofx
+
+
+def index() -> RuleIndex:
+    ledger = pd.DataFrame({"Name": ["Trader Joes #552", "Trader Joes #552", "Sweetgreen Union Sq", "Sweetgreen Union Sq",
+                                    "Sweetgreen Union Sq", "Sweetgreen Soho", "Acme"],
+                           "Type": ["Food", "Food", "Food", "Food", "Food", "Grocery", "Shop"]})
+    return RuleIndex.from_ledger(ledger)
+
+
+def categorize(names: list) -> list:
+    return index().categorize(pd.Series(names)).tolist()
+
+
+def test_exact_name_wins_over_the_rules():
+    # the keyword rules would say Grocery, the ledger says Food (store numbers don't count)
+    assert categorize(["TRADER JOES #1234"]) == ["Food"]
+
+
+def test_longest_learned_prefix_with_its_most_used_type():
+    assert categorize(["SWEETGREEN MIDTOWN", "SWEETGREEN SOHO NYC"]) == ["Food", "Grocery"]
+
+
+def test_short_prefixes_fall_through_to_the_rules():
+    # 'ACME' is only 4 characters of a learned name
+    assert categorize(["ACME SUPERMARKET"]) == ["Grocery"]
+
+
+def test_rules_apply_in_order_not_by_position_in_the_name():
+    assert categorize(["AMAZON WHOLE FOODS", "TARGET GROCERY PICKUP", "WALMART PHARMACY", "UBER EATS", "UBER TRIP"]) \
+        == ["Grocery", "Grocery", "HealthWell", "Food", "TransportationT"]
+
+
+def test_unknown_names_get_the_default():
+    assert categorize(["ZZZ QQQ", ""]) == ["Other", "Other"]
+    assert index().categorize(pd.Series(["ZZZ QQQ"]), default="Shop").tolist() == ["Shop"]
+
+
+def test_ofx_ids_are_the_account_and_fitid(tmp_path):
+    path = tmp_path / "statement.qfx"
+    path.write_text("""OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKACCTFROM><ACCTID>1234</BANKACCTFROM><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240105<TRNAMT>-2.90<FITID>77<NAME>TRANSIT
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240105<TRNAMT>-2.90<FITID>78<NAME>TRANSIT
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240106<TRNAMT>-4.00<NAME>CAFE
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+""")
+    df = read_ofx(path)
+    assert df["Id"].tolist() == ["1234:77", "1234:78", ""]
+    assert df["Amount"].tolist() == [-290, -290, -400]
@@ -0,0 +1,60 @@
+"""
+insert_expense.insert_rows: what's written, set aside as a duplicate or only
+warned about, with and without transaction ids.
+
+python -m pytest tests
+"""
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+import pandas as pd
+import pytest
+
+import insert_expense
+import ledger_store
+
+header = b"Name,Amount,Type,Date\n"
+
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    file_path = tmp_path / "Expenses - Expense_Data.csv"
+    file_path.write_bytes(header + b"Coffee,3.50,Food,01/02/2024\n")
+    monkeypatch.setattr(insert_expense, "file_path", file_path)
+    # the store only keeps duplicate keys for the expense data
+    monkeypatch.setattr(ledger_store, "expense_fp", file_path)
+    return file_path
+
+
+def rows(*rows) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=insert_expense.columns)
+
+
+def test_repeats_within_an_import_are_kept(ledger, tmp_path):
+    fares = rows(("Transit", "2.90", "TransportationT", "01/05/2024"), ("Transit", "2.90", "TransportationT", "01/05/2024"))
+    assert insert_expense.insert_rows(fares, tmp_path / "rejected.csv") == (2, 0)
+    # unless asked, then the second one is the duplicate
+    assert insert_expense.insert_rows(fares.assign(Date="01/09/2024"), within_batch=True) == (1, 1)
+
+
+def test_only_exact_duplicates_are_set_aside(ledger, tmp_path, capsys):
+    quarantine = tmp_path / "rejected.csv"
+    new = rows(("Coffee", "3.50", "Food", "01/02/2024"), ("Coffee", "3.50", "Food", "01/03/2024"))
+    assert insert_expense.insert_rows(new, quarantine) == (1, 1)
+
+    assert pd.read_csv(quarantine)["Reason"].tolist() == ["duplicate"]
+    assert "01/03/2024" in ledger.read_text()
+    assert "1 rows look like ones already in the data" in capsys.readouterr().err
+
+
+def test_transaction_ids_decide_what_is_a_duplicate(ledger):
+    # a second coffee that day, the bank says it's a new one
+    new = rows(("Coffee", "3.50", "Food", "01/02/2024"), ("Bagel", "2.00", "Food", "01/02/2024"))
+    ids = pd.Series(["1:a", "1:b"])
+    assert insert_expense.insert_rows(new, ids=ids) == (2, 0)
+    assert ledger.read_text().count("Coffee") == 2
+
+    # the same statement again
+    assert insert_expense.insert_rows(new, ids=ids) == (0, 2)
+    assert insert_expense.insert_rows(rows(("Bagel", "2.00", "Food", "01/02/2024")), ids=pd.Series(["1:c"])) == (1, 0)
@@ -0,0 +1,67 @@
+"""
+ledger_backup: backups and restores, and gc waiting for a backup in progress.
+
+python -m pytest tests
+"""
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+import datetime
+import threading
+
+import pytest
+
+import ledger_backup
+
+header = b"Name,Amount,Type,Date\n"
+
+
+@pytest.fixture
+def backup_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger_backup, "backup_fp", tmp_path / "backup")
+    monkeypatch.setattr(ledger_backup, "chunk_fp", tmp_path / "backup" / "chunks")
+    monkeypatch.setattr(ledger_backup, "lock_fp", tmp_path / "backup" / "backup.lock")
+    return tmp_path / "backup"
+
+
+def ledger(tmp_path: Path, rows: int) -> Path:
+    file_path = tmp_path / "Expenses - Expense_Data.csv"
+    file_path.write_bytes(header + b"".join(f"N{row},{row}.00,Food,01/01/2024\n".encode() for row in range(rows)))
+    return file_path
+
+
+def test_restore_puts_back_each_backup(tmp_path, backup_dir):
+    file_path = ledger(tmp_path, 5000)
+    first = file_path.read_bytes()
+    taken = ledger_backup.backup(file_path, datetime.datetime(2024, 1, 1))
+    with open(file_path, "ab") as file:
+        file.write(b"Z,9.00,Shop,01/02/2024\n")
+    ledger_backup.backup(file_path, datetime.datetime(2024, 1, 2))
+
+    target = tmp_path / "restored.csv"
+    assert ledger_backup.restore(file_path, datetime.datetime(2024, 1, 1, 12), target) == taken
+    assert target.read_bytes() == first
+    ledger_backup.restore(file_path, target=target)
+    assert target.read_bytes() == file_path.read_bytes()
+
+
+def test_collect_waits_for_the_backup_in_progress(tmp_path, backup_dir):
+    file_path = ledger(tmp_path, 10)
+    ledger_backup.backup(file_path)
+
+    # a backup that wrote its chunk but not its manifest yet
+    with ledger_backup.locked():
+        chunk = ledger_backup._chunk_path("0" * 40)
+        chunk.parent.mkdir(parents=True, exist_ok=True)
+        chunk.write_bytes(b"")
+        collect = threading.Thread(target=ledger_backup.collect_chunks)
+        collect.start()
+        collect.join(0.3)
+        assert collect.is_alive()
+        assert chunk.exists()
+    collect.join()
+
+    # nothing refers to it once the lock is let go
+    assert not chunk.exists()
+    assert ledger_backup.restore(file_path, target=tmp_path / "restored.csv")
@@ -0,0 +1,86 @@
+"""
+SpendCube.fold of new rows against a cube built from all the rows at once.
+
+python -m pytest tests
+"""
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ledger_cube import SpendCube, capped_names
+from ledger_store import ledger_dtypes, typed_columns
+
+
+def rows(lines: list) -> pd.DataFrame:
+    # typed like a ledger's rows
+    return typed_columns(pd.read_csv(io.StringIO("Name,Amount,Type,Date\n" + "".join(lines)), dtype=ledger_dtypes))
+
+
+def synthetic_lines(count: int, first: str, days: int, types: list, seed: int) -> list:
+    rng = np.random.default_rng(seed)
+    dates = (pd.Timestamp(first) + pd.to_timedelta(rng.integers(0, days, count), unit="D")).strftime("%m/%d/%Y")
+    return [f"N{rng.integers(0, 30)},{rng.integers(1, 5000) / 100},{rng.choice(types)},{date}\n" for date in dates]
+
+
+def assert_same_cube(folded: SpendCube, built: SpendCube):
+    assert folded.days.equals(built.days)
+    assert set(folded.types) == set(built.types)
+    columns = folded.types.get_indexer(built.types)
+    np.testing.assert_array_equal(folded.daily[:, columns], built.daily)
+    np.testing.assert_array_equal(folded.totals[:, columns], built.totals)
+    np.testing.assert_array_equal(folded.dow_totals[:, :, columns], built.dow_totals)
+    # rollups are sorted by date, the order within a date doesn't matter
+    for folded_names, built_names in ((folded.names, built.names), (folded.month_names, built.month_names)):
+        assert folded_names["Date"].is_monotonic_increasing
+        pd.testing.assert_frame_equal(folded_names.sort_values(["Date", "Name", "Type"], ignore_index=True),
+                                      built_names.sort_values(["Date", "Name", "Type"], ignore_index=True))
+
+
+batches = {
+    "appended": [("2024-01-01", 60, ["Food", "Rent"]), ("2024-03-01", 40, ["Food", "Shop"])],
+    "same days": [("2024-01-01", 60, ["Food", "Rent"]), ("2024-02-01", 29, ["Food", "Rent"])],
+    "back-dated": [("2024-01-01", 60, ["Food", "Rent"]), ("2023-11-15", 120, ["Grocery", "Food"])],
+    "gap": [("2024-01-01", 10, ["Food"]), ("2024-06-01", 10, ["Food"]), ("2024-02-01", 10, ["Rent"])],
+}
+
+
+@pytest.mark.parametrize("name", batches)
+def test_fold_matches_a_fresh_build(name):
+    lines = [synthetic_lines(300, first, days, types, seed) for seed, (first, days, types) in enumerate(batches[name])]
+    folded = SpendCube(rows(lines[0]))
+    for batch in lines[1:]:
+        folded.fold(rows(batch))
+    assert_same_cube(folded, SpendCube(rows(sum(lines, []))))
+
+
+def test_fold_leaves_the_old_cube_as_it_was():
+    cube = SpendCube(rows(synthetic_lines(200, "2024-01-01", 60, ["Food", "Rent"], 0)))
+    totals, names = cube.totals.copy(), cube.names.copy()
+    folded = SpendCube.__new__(SpendCube)
+    folded.__dict__.update(cube.__dict__)
+    folded.fold(rows(synthetic_lines(50, "2024-01-15", 10, ["Food", "Shop"], 1)))
+
+    np.testing.assert_array_equal(cube.totals, totals)
+    pd.testing.assert_frame_equal(cube.names, names)
+
+
+def test_capped_months_keep_the_biggest_names_and_exact_type_totals():
+    lines = synthetic_lines(600, "2024-01-01", 60, ["Food", "Rent", "Shop"], 0)
+    # a name that's biggest in January
+    lines += ["Big,900.00,Food,01/15/2024\n"]
+    built = SpendCube(rows(lines))
+    capped = SpendCube(rows(lines[:300]), month_cap=5)
+    capped.fold(rows(lines[300:]))
+
+    assert capped.month_names.groupby("Date").size().max() <= 5 + 3
+    pd.testing.assert_series_equal(capped.month_names.groupby(["Date", "Type"])["Amount"].sum(),
+                                   built.month_names.groupby(["Date", "Type"])["Amount"].sum())
+    january = capped.name_sums("2024-01-01", "2024-01-31").set_index(["Name", "Type"])["Amount"]
+    assert january[("Big", "Food")] == 90000
+    assert (capped_names, "Food") in january.index
@@ -0,0 +1,85 @@
+"""
+Crash recovery of ledger_io: writes cut off at the worst moments, then the
+next writer's recover().
+
+python -m pytest tests
+"""
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+import os
+
+import ledger_io
+
+header = b"Name,Amount,Type,Date\n"
+rows = b"A,1.00,Food,01/01/2024\nB,2.00,Rent,01/02/2024\n"
+
+
+def ledger(tmp_path: Path, data: bytes = header + rows) -> Path:
+    file_path = tmp_path / "Expenses - Expense_Data.csv"
+    file_path.write_bytes(data)
+    return file_path
+
+
+def crashed_write(file_path: Path, offset: int, data: bytes, replace: bool):
+    # what write() logs before touching the file, the writer then dies
+    ledger_io._log(file_path, {"seq": "1", "offset": offset, "base_size": os.path.getsize(file_path),
+                               "replace": replace, "data": data.decode()})
+
+
+def test_torn_append_is_finished(tmp_path):
+    file_path = ledger(tmp_path)
+    new_rows = b"C,3.00,Shop,01/03/2024\nD,4.00,Shop,01/04/2024\n"
+    crashed_write(file_path, len(header + rows), new_rows, replace=False)
+    # half of the append made it to disk
+    with open(file_path, "ab") as file:
+        file.write(new_rows[:30])
+
+    ledger_io.recover(file_path)
+    assert file_path.read_bytes() == header + rows + new_rows
+    assert ledger_io.journal_path(file_path).read_bytes() == b""
+
+
+def test_rewrite_cut_before_rename_is_redone(tmp_path):
+    file_path = ledger(tmp_path)
+    rewritten = b"A,1.50,Food,01/01/2024\n"
+    crashed_write(file_path, len(header), rewritten, replace=True)
+    # the temp file was being written, the ledger itself is untouched
+    file_path.with_name(f"{file_path.name}.tmp").write_bytes(header + rewritten[:10])
+
+    ledger_io.recover(file_path)
+    assert file_path.read_bytes() == header + rewritten
+    assert ledger_io.journal_path(file_path).read_bytes() == b""
+
+
+def test_file_changed_outside_the_journal_is_left_alone(tmp_path):
+    file_path = ledger(tmp_path)
+    crashed_write(file_path, len(header), b"A,1.50,Food,01/01/2024\n", replace=True)
+    edited = header + rows + b"Z,9.00,Other,01/09/2024\n"
+    file_path.write_bytes(edited)
+
+    ledger_io.recover(file_path)
+    assert file_path.read_bytes() == edited
+    assert ledger_io.journal_path(file_path).read_bytes() == b""
+
+
+def test_torn_record_is_dropped(tmp_path):
+    file_path = ledger(tmp_path)
+    ledger_io.journal_path(file_path).write_bytes(b'{"seq": "1", "offset": 2')
+
+    ledger_io.recover(file_path)
+    assert file_path.read_bytes() == header + rows
+    assert ledger_io.journal_path(file_path).read_bytes() == b""
+
+
+def test_journal_only_holds_the_write_in_progress(tmp_path):
+    file_path = ledger(tmp_path, header + rows * 1000)
+    for amount in range(10):
+        with ledger_io.locked(file_path):
+            ledger_io.write(file_path, len(header), f"A,{amount}.00,Food,01/01/2024\n".encode() + rows * 999)
+    with ledger_io.locked(file_path):
+        ledger_io.write(file_path, os.path.getsize(file_path), b"C,3.00,Shop,01/03/2024\n", replace=False)
+
+    assert ledger_io.journal_path(file_path).read_bytes() == b""
+    assert file_path.read_bytes().endswith(b"C,3.00,Shop,01/03/2024\n")
@@ -0,0 +1,135 @@
+"""
+Editor saves through LedgerStore.apply_changes, against a ledger that
+changed since the editor loaded it, and ExpenseLedger telling an append
+from an edit.
+
+python -m pytest tests
+"""
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+import os
+
+import pandas as pd
+import pytest
+
+import ledger_io
+from ledger_store import ExpenseLedger, InvalidRows, LedgerStore, RowsChanged, ledger_dtypes
+
+header = b"Name,Amount,Type,Date\n"
+
+
+def ledger(tmp_path: Path) -> Path:
+    file_path = tmp_path / "Expenses - Income_Data.csv"
+    file_path.write_bytes(header + b"A,1.00,Income,01/01/2024\nB,2.5,Income,01/02/2024\nC,3,Income,01/03/2024\n")
+    return file_path
+
+
+def shown(row_id: int, name: str, amount: float, day: int) -> dict:
+    # a row as an editor page serves it (ledger_pages.ledger_page)
+    return {"id": row_id, "Name": name, "Amount": amount, "Type": "Income", "Date": f"01/0{day}/2024"}
+
+
+def test_save_of_moved_rows_is_rejected(tmp_path):
+    file_path = ledger(tmp_path)
+    store = LedgerStore()
+    # both tabs loaded the same page, the first one deletes A
+    store.apply_changes(file_path, {}, [0], {"0": shown(0, "A", 1.0, 1)})
+
+    # the second one edits B, which is row 0 now
+    with pytest.raises(RowsChanged) as rejected:
+        store.apply_changes(file_path, {"1": shown(1, "B-edited", 2.5, 2)}, [], {"1": shown(1, "B", 2.5, 2)})
+    assert rejected.value.row_ids == [1]
+    assert file_path.read_bytes() == header + b"B,2.5,Income,01/02/2024\nC,3,Income,01/03/2024\n"
+
+    # past the end of the file
+    with pytest.raises(RowsChanged):
+        store.apply_changes(file_path, {"2": shown(2, "C-edited", 3.0, 3)}, [], {"2": shown(2, "C", 3.0, 3)})
+
+
+def test_save_of_unchanged_rows_goes_through(tmp_path):
+    file_path = ledger(tmp_path)
+    store = LedgerStore()
+    # rows added at the end in the meantime don't move the ones loaded
+    with open(file_path, "ab") as file:
+        file.write(b"D,4.00,Income,01/04/2024\n")
+
+    saved = store.apply_changes(file_path, {"1": shown(1, "B-edited", 2.75, 2), "-1": shown(-1, "E", 5.0, 5)}, [2],
+                                {"1": shown(1, "B", 2.5, 2), "2": shown(2, "C", 3.0, 3)})
+    assert saved == {"deleted": [2], "inserted": {-1: 3}}
+    assert file_path.read_bytes() == header + b"A,1.00,Income,01/01/2024\nB-edited,2.75,Income,01/02/2024\n" \
+                                              b"D,4.00,Income,01/04/2024\nE,5.00,Income,01/05/2024\n"
+
+
+def test_save_of_bad_rows_is_rejected(tmp_path):
+    file_path = ledger(tmp_path)
+    before = file_path.read_bytes()
+    store = LedgerStore()
+    rows = {"0": dict(shown(0, "A", 1.0, 1), Date="bad"),
+            "-1": shown(-1, "N", "seven", 5),
+            "-2": dict(shown(-2, "M", 7.0, 5), Type=""),
+            "-3": shown(-3, "O", "inf", 5)}
+
+    with pytest.raises(InvalidRows) as rejected:
+        store.apply_changes(file_path, rows, [], {"0": shown(0, "A", 1.0, 1)})
+    assert rejected.value.reasons == {0: "bad date (mm/dd/yyyy)", -1: "bad amount", -2: "unknown type",
+                                      -3: "bad amount"}
+    assert file_path.read_bytes() == before
+
+
+def test_edit_near_the_end_then_append_reloads(tmp_path):
+    file_path = tmp_path / "Expenses - Expense_Data.csv"
+    file_path.write_bytes(header + b"".join(f"N{row:05},1.00,Food,01/01/2024\n".encode() for row in range(10000)))
+    ledger = ExpenseLedger(file_path, ledger_dtypes)
+    assert ledger.frame()["Amount"].sum() == 10000 * 100
+
+    # the last row is edited in place (same length, same inode, way past the first prefix_bytes) and a row added
+    with open(file_path, "r+b") as file:
+        file.seek(-len(b"1.00,Food,01/01/2024\n"), os.SEEK_END)
+        file.write(b"9.00,Food,01/01/2024\n")
+        file.write(b"Z,2.00,Food,01/02/2024\n")
+
+    df = ledger.frame()
+    assert len(df) == 10001
+    assert df["Amount"].sum() == 10000 * 100 + 800 + 200
+
+
+def test_appends_are_folded_without_a_reload(tmp_path):
+    file_path = tmp_path / "Expenses - Expense_Data.csv"
+    file_path.write_bytes(header + b"A,1.00,Food,01/01/2024\n")
+    ledger = ExpenseLedger(file_path, ledger_dtypes)
+    ledger.frame()
+    loads = []
+    ledger.load = lambda: loads.append(1)
+
+    for day in range(2, 5):
+        with open(file_path, "ab") as file:
+            file.write(f"N{day},1.00,Food,01/0{day}/2024\n".encode())
+        assert len(ledger.frame()) == day
+    assert not loads
+
+
+def test_dedup_sees_rows_appended_since_it_was_built(tmp_path):
+    file_path = tmp_path / "Expenses - Expense_Data.csv"
+    file_path.write_bytes(header + b"A,1.00,Food,01/01/2024\n")
+    ledger = ExpenseLedger(file_path, ledger_dtypes)
+    row = pd.DataFrame({"Name": ["Coffee"], "Amount": [350], "Type": ["Food"], "Date": ["01/02/2024"]})
+    assert ledger.dedup.check(row).iloc[0] == ""
+
+    ledger_io.append(file_path, b"Coffee,3.50,Food,01/02/2024\n")
+    assert ledger.dedup.check(row).iloc[0] == "duplicate"
+
+
+@pytest.mark.parametrize("stream", (False, True))
+def test_last_row_without_a_newline_is_loaded(tmp_path, stream):
+    file_path = tmp_path / "Expenses - Expense_Data.csv"
+    file_path.write_bytes(header + b"A,1.00,Food,01/01/2024\nB,2.00,Food,01/02/2024")
+    ledger = ExpenseLedger(file_path, ledger_dtypes)
+    if stream:
+        ledger.stream_bytes = 0
+    assert ledger.frame()["Name"].tolist() == ["A", "B"]
+
+    # ledger_io adds the missing newline before appending
+    ledger_io.append(file_path, b"C,3.00,Food,01/03/2024\n")
+    assert ledger.frame()["Name"].tolist() == ["A", "B", "C"]
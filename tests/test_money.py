@@ -0,0 +1,31 @@
+"""
+money: amounts in and out of integer cents.
+
+python -m pytest tests
+"""
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
+
+import numpy as np
+import pandas as pd
+
+from money import cents_array, format_dollars, to_cents, to_dollars
+
+
+def test_to_cents_rounds_to_the_cent_written():
+    assert to_cents([12.5, "0.07", 0.1 + 0.2, "-3", 1234567.89]).tolist() == [1250, 7, 30, -300, 123456789]
+
+
+def test_to_cents_of_anything_not_a_number_is_na():
+    cents = to_cents(["seven", "", None, np.nan, "inf", "-inf", float("inf"), "1e30", -1e30, "1.5"])
+    assert cents.isna().tolist() == [True] * 9 + [False]
+    assert cents.iloc[-1] == 150
+    assert str(cents.dtype) == "Int64"
+
+
+def test_cents_back_to_dollars():
+    cents = pd.Series([1250, -5, None], dtype="Int64")
+    assert format_dollars(cents).tolist() == ["12.50", "-0.05", ""]
+    assert cents_array(cents).tolist() == [1250, -5, 0]
+    assert to_dollars(np.array([1250, -5])).tolist() == [12.5, -0.05]